@@ -0,0 +1,180 @@
+""" colorharmony 和 colorChord 热点路径的性能测试。
+
+用法::
+
+    python benchmark.py                              # 输出 JSON 结果
+    python benchmark.py -o baseline.json             # 保存为基准
+    python benchmark.py -b baseline.json -t 0.2      # 比基准慢 20% 以上时失败
+"""
+import argparse
+import itertools
+import json
+import platform
+import subprocess
+import sys
+import timeit
+
+import colorChord
+from colorharmony import Note, Chord, Container
+
+
+MASKS = [m for m in range(1 << 12) if m.bit_count() >= 2]
+CHORDS = [Chord.from_mask(m) for m in MASKS]
+
+
+def bench_note_construction():
+    names = itertools.cycle(["C", "C#", "Db", "F#/Gb", "A", "B"])
+    return lambda: Note(next(names))
+
+
+def bench_chord_construction():
+    values = itertools.cycle([[0, 4, 7], [2, 5, 9, 0], [11, 2, 5, 7, 9]])
+    return lambda: Chord(next(values))
+
+
+def bench_chord_hash():
+    chords = itertools.cycle(CHORDS)
+    return lambda: hash(next(chords))
+
+
+def bench_chord_set():
+    return lambda: set(CHORDS)
+
+
+def bench_harmony():
+    chords = itertools.cycle(CHORDS)
+    return lambda: next(chords).harmony()
+
+
+def bench_angle_5():
+    chords = itertools.cycle(CHORDS)
+    return lambda: next(chords).angle_5()
+
+
+def bench_container_all_notes():
+    return lambda: Container(notes=range(12))
+
+
+def bench_container_infer(size):
+    def setup():
+        container = Container(notes=range(size))
+        chords = itertools.cycle(CHORDS)
+        container.infer(CHORDS[0], None, None)
+        return lambda: container.infer(next(chords), None, None)
+    return setup
+
+
+def legacy_chords():
+    return [
+        colorChord.Chord([colorChord.cNote(i + 1) for i in range(12)
+                          if m >> i & 1])
+        for m in range(1, 1 << 12, 7)
+    ]
+
+
+def bench_legacy_get_harmony():
+    chords = itertools.cycle(legacy_chords())
+    return lambda: next(chords).get_harmony()
+
+
+def bench_legacy_get_fressness():
+    pairs = itertools.cycle(itertools.pairwise(legacy_chords()))
+    return lambda: colorChord.Chord.get_fressness新鲜度(*next(pairs))
+
+
+BENCHMARKS = {
+    "note_construction": bench_note_construction,
+    "chord_construction": bench_chord_construction,
+    "chord_hash": bench_chord_hash,
+    "chord_set": bench_chord_set,
+    "harmony": bench_harmony,
+    "angle_5": bench_angle_5,
+    "container_all_notes": bench_container_all_notes,
+    "container_infer_4": bench_container_infer(4),
+    "container_infer_7": bench_container_infer(7),
+    "container_infer_12": bench_container_infer(12),
+    "legacy_get_harmony": bench_legacy_get_harmony,
+    "legacy_get_fressness": bench_legacy_get_fressness,
+}
+
+
+def measure_import(repeat):
+    """ 在新的解释器中导入 colorharmony 所需的时间。 """
+    code = ("import time; start = time.perf_counter(); import colorharmony; "
+            "print(time.perf_counter() - start)")
+    return min(
+        float(subprocess.run([sys.executable, "-c", code], check=True,
+                             capture_output=True, text=True).stdout)
+        for _ in range(repeat)
+    )
+
+
+def measure(func, repeat, min_time):
+    """ 单次调用的最短用时（秒）。 """
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    number = max(number, int(number * min_time / 0.2))
+    return min(timer.repeat(repeat, number)) / number
+
+
+def run(names=None, repeat=5, min_time=0.2):
+    results = {}
+    for name, bench in BENCHMARKS.items():
+        if names and name not in names:
+            continue
+        results[name] = measure(bench(), repeat, min_time)
+    if not names or "import_colorharmony" in names:
+        results["import_colorharmony"] = measure_import(repeat)
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def compare(report, baseline, threshold):
+    """ 返回比基准慢`threshold`以上的测试 {名称: (当前, 基准)}。 """
+    regressions = {}
+    for name, seconds in report["results"].items():
+        base = baseline["results"].get(name)
+        if base is not None and seconds > base * (1 + threshold):
+            regressions[name] = (seconds, base)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("names", nargs="*", metavar="name",
+                        help="只运行这些测试，可选："
+                             + ", ".join([*BENCHMARKS, "import_colorharmony"]))
+    parser.add_argument("-o", "--output", help="把结果写入这个 JSON 文件")
+    parser.add_argument("-b", "--baseline", help="与这个 JSON 文件中的结果比较")
+    parser.add_argument("-t", "--threshold", type=float, default=0.2,
+                        help="允许的最大退化比例，默认 0.2")
+    parser.add_argument("-r", "--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2,
+                        help="每轮测量的最短时间（秒）")
+    args = parser.parse_args(argv)
+
+    report = run(args.names, args.repeat, args.min_time)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        for name, (seconds, base) in regressions.items():
+            print(f"{name}: {seconds:.3g}s vs baseline {base:.3g}s "
+                  f"(+{seconds / base - 1:.0%})", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
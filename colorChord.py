@@ -1,6 +1,35 @@
 import math
 from enum import Enum
 
+# 预计算的特征表（colorharmony.atlas.Atlas），见 use_atlas
+_atlas = None
+
+
+def use_atlas(atlas):
+    '''
+    让 Chord.get_harmony 和 Chord.get_theta 从预计算的特征表中查询结果
+    :param atlas: colorharmony.atlas.load_atlas() 的返回值，为 None 时恢复为直接计算
+    :return:
+    '''
+    global _atlas
+    _atlas = atlas
+
+
+# get_harmony 的结果，以 Chord.index_mask() 为下标，首次用到时计算
+_harmony_table = [None] * 4096
+
+
+def build_harmony_table():
+    '''
+    预先计算所有音符组合的 get_harmony 结果
+    :return:
+    '''
+    for mask in range(1, 4096):
+        if _harmony_table[mask] is None:
+            chord = Chord([cNote(i + 1) for i in range(12) if mask >> i & 1])
+            _harmony_table[mask] = \
+                Chord.get_harmony_by_features(*chord.get_features())
+
 
 class cNote(Enum):
 
@@ -73,6 +102,13 @@ class _Note:
     def angle(self):
         return self.index * 30 - 15
 
+    @property
+    def pitch_class(self):
+        '''
+        音符在半音阶中的位置，C=0, C#=1...
+        '''
+        return (self.index * 5 + 4) % 12
+
     def angle_to(self, other):
         return (self-other)*30
 
@@ -145,8 +181,42 @@ class Chord:
             cNote_list.append(cNote.get_cNote_by_name(i.name))
         return Chord(cNote_list,name)
 
+    def init_by_pitch_class_mask(mask:int, name = None):
+        '''
+        从 12 位掩码获取和弦对象，第 i 位对应 pitch_class 为 i 的音符，与 pitch_class_mask() 相反
+        '''
+        if not 0 < mask < 4096:
+            raise ValueError("mask must be between 1 and 4095")
+        # pitch_class = (index * 5 + 4) % 12 的逆运算
+        return Chord([cNote((v - 9) * 5 % 12 + 1) for v in range(12) if mask >> v & 1], name)
+
+    def index_mask(self):
+        '''
+        和弦的 12 位掩码，第 index-1 位对应 index 的音符；和弦中有重复音符时返回 None
+        :return: int or None
+        '''
+        mask = 0
+        for n in self.notes:
+            mask |= 1 << (n.index - 1)
+        return mask if mask.bit_count() == len(self.notes) else None
+
+    def pitch_class_mask(self):
+        '''
+        和弦的 12 位掩码，第 i 位对应 pitch_class 为 i 的音符；和弦中有重复音符时返回 None
+        :return: int or None
+        '''
+        mask = 0
+        for n in self.notes:
+            mask |= 1 << n.pitch_class
+        return mask if mask.bit_count() == len(self.notes) else None
+
     def get_theta(self)->list:
         # 计算和弦内音符对应向量的平均方向
+        if _atlas is not None and self.pitch_class_mask() is not None:
+            thetas = _atlas.legacy_theta(self.pitch_class_mask())
+            if len(thetas) == 1:
+                self.temp_theta = thetas[0]
+            return thetas
         thetas = []
         intervals = []
         for i in range(len(self.notes)):
@@ -250,12 +320,37 @@ class Chord:
         获得向量模长
         :return:
         '''
+        if _atlas is not None and self.pitch_class_mask() is not None:
+            return _atlas.legacy_harmony(self.pitch_class_mask())
+        mask = self.index_mask()
+        if mask is None:
+            return Chord.get_harmony_by_features(*self.get_features())
+        harmony = _harmony_table[mask]
+        if harmony is None:
+            harmony = Chord.get_harmony_by_features(*self.get_features())
+            _harmony_table[mask] = harmony
+        return harmony
+
+    def get_features(self)->tuple:
+        '''
+        计算协和度所需的特征
+        :return: (纯五跨度数, 大二度数, 半音程数, 是否存在大三和弦, 是否存在小三和弦)
+        '''
+        return (
+            self.pure_fifth_span(),
+            self.get_Major2nd(),
+            self.get_semitones(),
+            self.if_Major_Chord_exist(),
+            self.if_Minor_Chord_exist(),
+        )
+
+    @staticmethod
+    def get_harmony_by_features(perfect5, Major2, Minor2, Major, Minor):
+        '''
+        由 get_features() 的结果计算向量模长
+        :return:
+        '''
         harmony = 1.77777
-        perfect5 = self.pure_fifth_span()
-        Major2 = self.get_Major2nd()
-        Minor2 = self.get_semitones()
-        Major = self.if_Major_Chord_exist()
-        Minor = self.if_Minor_Chord_exist()
         if perfect5>=2 and perfect5<=4 and Minor2==0:
             if Major2<=1:
                 if(Major or Minor):
@@ -390,3 +485,84 @@ class Chord:
             new_notes.append(i.next(n))
         return Chord.initBy_Note(new_notes,new_name)
 
+
+
+def get_pair_matrices(chords:list, tile_size=512, directory=None):
+    '''
+    计算 chords 中所有有序和弦对 (chord1, chord2) 的色彩变化、紧张度变化和新鲜度
+
+    按 tile_size x tile_size 分块用 numpy 计算，内存占用与和弦数量无关。
+    多个角度的和弦按 Chord.get_color_change色彩变化 的规则选取角度，
+    结果与对已经调用过 get_theta() 的和弦调用这三个函数相同（float32 精度）。
+    :param chords: Chord 列表
+    :param tile_size: 每块的行数和列数
+    :param directory: 不为 None 时，结果以内存映射的方式写入该目录下的
+        color_change.npy、tension_change.npy 和 freshness.npy
+    :return: (色彩变化, 紧张度变化, 新鲜度)，float32 矩阵，第 i 行第 j 列对应 (chords[i], chords[j])
+    '''
+    import os
+    import numpy as np
+
+    if tile_size <= 0:
+        raise ValueError("tile_size must be positive")
+    n = len(chords)
+    harmony = np.array([c.get_harmony() for c in chords], dtype=np.float64)
+    thetas = np.full((n, 12), np.nan)
+    count = np.zeros(n, dtype=np.intp)
+    for i, c in enumerate(chords):
+        t = c.get_theta()
+        thetas[i, :len(t)] = t
+        count[i] = len(t)
+    single = count == 1
+    last = thetas[np.arange(n), count - 1]
+
+    def angle_diff(a1, a2):
+        diff = np.abs(a1 - a2) % 360
+        return np.where(diff <= 180, diff, 360 - diff)
+
+    def closest(candidates, angle):
+        # candidates 中与 angle 相差最小的角度，相差相同时取靠前的
+        diff = angle_diff(candidates, angle[..., None])
+        index = np.argmin(np.where(np.isnan(diff), np.inf, diff), axis=-1)
+        return np.take_along_axis(candidates, index[..., None], axis=-1)[..., 0]
+
+    names = ["color_change", "tension_change", "freshness"]
+    if directory is None:
+        results = [np.empty((n, n), dtype=np.float32) for _ in names]
+    else:
+        results = [
+            np.lib.format.open_memmap(os.path.join(directory, name + ".npy"),
+                                      mode="w+", dtype=np.float32, shape=(n, n))
+            for name in names
+        ]
+    color_out, tension_out, freshness_out = results
+
+    for i0 in range(0, n, tile_size):
+        rows = slice(i0, min(i0 + tile_size, n))
+        for j0 in range(0, n, tile_size):
+            cols = slice(j0, min(j0 + tile_size, n))
+            single1 = single[rows, None]
+            single2 = single[None, cols]
+            last1 = np.broadcast_to(last[rows, None], (single1.size, single2.size))
+            last2 = np.broadcast_to(last[None, cols], last1.shape)
+            thetas1 = np.broadcast_to(thetas[rows, None, :], last1.shape + (12,))
+            thetas2 = np.broadcast_to(thetas[None, cols, :], last1.shape + (12,))
+            # 两个和弦都有多个角度时，原实现取的是最后一个角度
+            angle1 = np.where(single1 | ~single2, last1, closest(thetas1, last2))
+            angle2 = np.where(single2 | ~single1, last2, closest(thetas2, last1))
+
+            angle1 = np.radians(angle1)
+            angle2 = np.radians(angle2)
+            r1 = harmony[rows, None]
+            r2 = harmony[None, cols]
+            color = np.sqrt((r2 * np.cos(angle2) - r1 * np.cos(angle1)) ** 2
+                            + (r2 * np.sin(angle2) - r1 * np.sin(angle1)) ** 2)
+            tension = np.abs(r2 - r1)
+            color_out[rows, cols] = color
+            tension_out[rows, cols] = tension
+            freshness_out[rows, cols] = tension + color
+
+    if directory is not None:
+        for result in results:
+            result.flush()
+    return color_out, tension_out, freshness_out
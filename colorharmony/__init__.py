@@ -2,5 +2,34 @@ from .circle import Circle
 from .note import Note
 from .chord import Chord
 from .container import Container
-from .view import show_chords
 
+# 依赖 NumPy 或 matplotlib 的部分在第一次访问时才导入，
+# 使`import colorharmony`只加载纯 Python 的核心模块
+_lazy_attributes = {
+    "ColumnarContainer": ".columnar",
+    "ProgressionGenerator": ".progression",
+    "ProgressionPlanner": ".planner",
+    "harmony_many": ".batch",
+    "angle_5_many": ".batch",
+    "count_1_many": ".batch",
+    "count_5_many": ".batch",
+    "transition_many": ".batch",
+    "Voicing": ".voicing",
+    "show_chords": ".view",
+    "ChordRenderer": ".view",
+    "render_many": ".view",
+}
+
+
+def __getattr__(name):
+    if name in _lazy_attributes:
+        import importlib
+        module = importlib.import_module(_lazy_attributes[name], __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_lazy_attributes))
@@ -0,0 +1,167 @@
+""" 所有和弦的预计算特征表。
+
+特征表是一个以和弦掩码为下标、共 4096 行的定长记录文件，可以直接内存映射，
+因此进程启动时不需要再计算任何特征。
+
+构建::
+
+    python -m colorharmony.atlas [path]
+"""
+import os
+import struct
+import sys
+
+import numpy as np
+
+from .chord import FULL_MASK
+from . import chord as _chord
+from .transposition import ClassFeatures, canonical
+
+
+ATLAS_VERSION = 1
+ATLAS_MAGIC = b"CHATLAS\0"
+ATLAS_HEADER = struct.Struct("<8sII")
+ATLAS_DTYPE = np.dtype([
+    ("harmony", "<f8"),
+    ("angle_5", "<f8", (12,)),              # 以各个音符为`base_note`
+    ("intervals", "<u1", (12,)),
+    ("legacy_harmony", "<f8"),              # colorChord.Chord.get_harmony()
+    ("legacy_theta", "<f8", (12,)),         # colorChord.Chord.get_theta()
+    ("legacy_theta_count", "<u1"),
+])
+DEFAULT_ATLAS_PATH = os.path.join(os.path.dirname(__file__), "atlas.bin")
+
+
+def legacy_chord(mask):
+    """ 与掩码对应的`colorChord.Chord`。 """
+    import colorChord
+    return colorChord.Chord.init_by_pitch_class_mask(mask)
+
+
+def build_atlas(path=DEFAULT_ATLAS_PATH):
+    """ 计算所有和弦的特征并写入`path`。
+
+    少于 2 个音符的掩码没有对应的`Chord`，其`harmony`和`angle_5`为`nan`；
+    掩码 0 的所有浮点特征都为`nan`。除`legacy_theta`外，
+    每个移调等价类的特征只计算一次，见`transposition`。
+    """
+    table = np.zeros(FULL_MASK + 1, dtype=ATLAS_DTYPE)
+    for field in ["harmony", "angle_5", "legacy_harmony", "legacy_theta"]:
+        table[field] = np.nan
+
+    features = ClassFeatures()
+    legacy_harmony = {}
+    for mask in range(1, FULL_MASK + 1):
+        row = table[mask]
+        prime, _ = canonical(mask)
+        if mask.bit_count() >= 2:
+            row["harmony"] = features.harmony(mask)
+            row["angle_5"] = [features.angle_5(mask, _) for _ in range(12)]
+            row["intervals"] = features.interval_vector(mask)
+        legacy = legacy_chord(mask)
+        # get_theta() 的结果在移调后只能近似地旋转，因此逐个计算
+        thetas = legacy.get_theta()
+        if prime not in legacy_harmony:
+            legacy_harmony[prime] = legacy.get_harmony()
+        row["legacy_harmony"] = legacy_harmony[prime]
+        row["legacy_theta"][:len(thetas)] = thetas
+        row["legacy_theta_count"] = len(thetas)
+
+    with open(path, "wb") as f:
+        f.write(ATLAS_HEADER.pack(ATLAS_MAGIC, ATLAS_VERSION, len(table)))
+        f.write(table.tobytes())
+    return path
+
+
+def load_atlas(path=DEFAULT_ATLAS_PATH, mmap=True):
+    """ 读取`build_atlas`写入的特征表。
+
+    Raises
+    ------
+    ValueError
+        文件不是特征表，或者版本与`ATLAS_VERSION`不一致。
+    """
+    with open(path, "rb") as f:
+        header = f.read(ATLAS_HEADER.size)
+    if len(header) != ATLAS_HEADER.size:
+        raise ValueError(f"expected atlas file, got {path}")
+    magic, version, count = ATLAS_HEADER.unpack(header)
+    if magic != ATLAS_MAGIC:
+        raise ValueError(f"expected atlas file, got {path}")
+    if version != ATLAS_VERSION:
+        raise ValueError(
+            f"expected atlas version {ATLAS_VERSION}, got {version}"
+        )
+    if count != FULL_MASK + 1:
+        raise ValueError(f"expected {FULL_MASK + 1} rows, got {count}")
+
+    if mmap:
+        table = np.memmap(path, dtype=ATLAS_DTYPE, mode="r",
+                          offset=ATLAS_HEADER.size, shape=(count,))
+    else:
+        table = np.fromfile(path, dtype=ATLAS_DTYPE,
+                            offset=ATLAS_HEADER.size, count=count)
+    return Atlas(table)
+
+
+class Atlas:
+    """ 以和弦掩码为下标的特征表。
+
+    Attributes
+    ----------
+    table : numpy.ndarray
+        结构化数组，字段见`ATLAS_DTYPE`。
+    """
+
+    def __init__(self, table):
+        if table.dtype != ATLAS_DTYPE or table.shape != (FULL_MASK + 1,):
+            raise ValueError(
+                f"expected {FULL_MASK + 1} rows of {ATLAS_DTYPE}, "
+                f"got {table.shape} of {table.dtype}"
+            )
+        self.table = table
+        self.__harmony = table["harmony"]
+        self.__angle_5 = table["angle_5"]
+        self.__intervals = table["intervals"]
+        self.__legacy_harmony = table["legacy_harmony"]
+        self.__legacy_theta = table["legacy_theta"]
+        self.__legacy_theta_count = table["legacy_theta_count"]
+
+    def harmony(self, mask):
+        return float(self.__harmony[mask])
+
+    def angle_5(self, mask, base=0):
+        return float(self.__angle_5[mask, base])
+
+    def interval_vector(self, mask):
+        return self.__intervals[mask].tolist()
+
+    def legacy_harmony(self, mask):
+        """ 同`colorChord.Chord.get_harmony()`，类型也相同。 """
+        value = float(self.__legacy_harmony[mask])
+        # get_harmony 的决策树中整数结果是 int，其余的都不是整数
+        return int(value) if value.is_integer() else value
+
+    def legacy_theta(self, mask):
+        count = self.__legacy_theta_count[mask]
+        return self.__legacy_theta[mask, :count].tolist()
+
+    def harmony_many(self, masks):
+        return self.__harmony[masks]
+
+    def angle_5_many(self, masks, base=0):
+        return self.__angle_5[masks, base]
+
+
+def use_atlas(atlas):
+    """ 让`Chord`和`colorharmony.batch`从`atlas`中查询特征。
+
+    `atlas`为`None`时恢复为直接计算。
+    """
+    if atlas is not None and not isinstance(atlas, Atlas):
+        raise TypeError(f"expected Atlas, got {type(atlas)}")
+    _chord._atlas = atlas
+
+
+if __name__ == "__main__":
+    print(build_atlas(*sys.argv[1:2]))
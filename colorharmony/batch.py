@@ -0,0 +1,209 @@
+import numpy as np
+
+from .note import Note
+from .chord import Chord, INTERVAL_WEIGHTS, FULL_MASK
+from .chord import rotate, pattern_mask_1, pattern_mask_5
+from . import chord as _chord
+from .parallel import map_chunks
+from .stream import transition
+
+
+def as_masks(chords):
+    """ 将一组和弦转换为 12 位掩码数组。
+
+    Parameters
+    ----------
+    chords : array_like
+        可以是掩码的一维整数数组，每行为一个和弦的音符值的二维整数数组，
+        由`Chord`、掩码、音符值列表组成的序列，或者带有`masks()`方法的对象
+        （如`ColumnarContainer`）。形状为`(n, 12)`的 0/1 数组需要先用
+        `from_bits`转换。
+
+    Returns
+    -------
+    numpy.ndarray
+        `uint16`类型的一维掩码数组。
+    """
+    if hasattr(chords, "masks"):
+        chords = np.asarray(chords.masks())
+    if isinstance(chords, np.ndarray):
+        array = chords
+    else:
+        chords = list(chords)
+        if all(isinstance(_, Chord) for _ in chords):
+            array = np.fromiter((_.mask() for _ in chords),
+                                dtype=np.int64, count=len(chords))
+        elif all(isinstance(_, int | np.integer) for _ in chords):
+            array = np.asarray(chords, dtype=np.int64)
+        else:
+            array = np.fromiter(
+                (Chord(_.tolist() if isinstance(_, np.ndarray) else _).mask()
+                 for _ in chords),
+                dtype=np.int64, count=len(chords))
+
+    if array.size and not np.issubdtype(array.dtype, np.integer):
+        raise TypeError(f"expected integer masks or values, got {array.dtype}")
+    if array.ndim == 2:
+        # 与音符值列表相同，每行的音符值可以重复
+        if np.any((array < 0) | (array >= 12)):
+            raise ValueError("expected value in range(0, 12)")
+        masks = np.bitwise_or.reduce(
+            np.left_shift(1, array.astype(np.int64)), axis=1, initial=0)
+    elif array.ndim == 1 or array.ndim == 0:
+        masks = np.atleast_1d(array).astype(np.int64)
+        if np.any((masks < 0) | (masks > FULL_MASK)):
+            raise ValueError(f"expected mask in range(0, {FULL_MASK + 1})")
+    else:
+        raise ValueError(f"expected 1 or 2 dimensions, got {array.ndim}")
+
+    masks = masks.astype(np.uint16)
+    if np.any(bits(masks).sum(axis=1) < 2):
+        raise ValueError("expected length >= 2 for every chord")
+    return masks
+
+
+def from_bits(rows):
+    """ `bits`的逆运算：形状为`(n, 12)`的 0/1 数组转换为掩码数组。
+
+    第`i`列不为 0 表示和弦含有音符值`i`。
+    """
+    rows = np.asarray(rows)
+    if rows.ndim != 2 or rows.shape[1] != 12:
+        raise ValueError(f"expected shape (n, 12), got {rows.shape}")
+    masks = ((rows != 0).astype(np.int64) << np.arange(12)).sum(axis=1)
+    return as_masks(masks)
+
+
+def bits(masks):
+    """ 将掩码数组展开为形状为`(n, 12)`的 0/1 数组。 """
+    masks = np.asarray(masks, dtype=np.uint16)
+    return ((masks[:, None] >> np.arange(12, dtype=np.uint16)) & 1) \
+        .astype(np.int64)
+
+
+def interval_vectors(masks):
+    """ `Chord.interval_vector()`的批量版本，返回形状为`(n, 12)`的数组。 """
+    b = bits(as_masks(masks))
+    counts = np.zeros_like(b)
+    for i in range(1, 12):
+        counts[:, i] = (b & np.roll(b, -i, axis=1)).sum(axis=1)
+    return counts
+
+
+def harmony_many(masks, processes=None):
+    """ `Chord.harmony()`的批量版本。
+
+    返回值与对每个和弦分别调用`Chord.harmony()`的结果完全相同。
+    `processes`大于 1 时在这么多个进程中分块计算，见`parallel.map_chunks`。
+    """
+    if processes is not None and processes > 1:
+        masks = as_masks(masks)
+        return map_chunks(harmony_many, [masks], masks.shape,
+                          processes=processes)
+    if _chord._atlas is not None:
+        return _chord._atlas.harmony_many(as_masks(masks))
+    counts = interval_vectors(masks)
+    weighted = counts @ np.asarray(INTERVAL_WEIGHTS, dtype=np.int64)
+    return weighted / counts.sum(axis=1)
+
+
+def angle_5_many(masks, base_note=Note("C"), processes=None):
+    """ `Chord.angle_5()`的批量版本。
+
+    返回值与对每个和弦分别调用`Chord.angle_5(base_note)`的结果完全相同。
+    `processes`的含义同`harmony_many`。
+    """
+    if not isinstance(base_note, Note):
+        raise TypeError(f"expected Note, got {type(base_note)}")
+    if processes is not None and processes > 1:
+        masks = as_masks(masks)
+        return map_chunks(angle_5_many, [masks], masks.shape,
+                          processes=processes, args=(base_note,))
+    if _chord._atlas is not None:
+        return _chord._atlas.angle_5_many(as_masks(masks), base_note.value())
+    b = bits(as_masks(masks))
+    positions = (np.arange(12) - base_note.value()) * 5 % 12
+    return (b @ positions) / b.sum(axis=1)
+
+
+def transition_many(masks1, masks2, processes=None):
+    """ 逐对计算从`masks1[i]`到`masks2[i]`的色彩变化、紧张度变化和新鲜度。
+
+    每一对的结果与`stream.transition`相同，即按`colorChord`的规则计算。
+    `processes`的含义同`harmony_many`。
+
+    Returns
+    -------
+    numpy.ndarray
+        形状为`(n, 3)`的数组，三列依次为色彩变化、紧张度变化和新鲜度。
+    """
+    masks1 = as_masks(masks1)
+    masks2 = as_masks(masks2)
+    if len(masks1) != len(masks2):
+        raise ValueError(f"expected masks of the same length, "
+                         f"got {len(masks1)} and {len(masks2)}")
+    if processes is not None and processes > 1:
+        return map_chunks(transition_many, [masks1, masks2],
+                          (len(masks1), 3), processes=processes)
+    result = np.empty((len(masks1), 3), dtype=np.float64)
+    for i, (mask1, mask2) in enumerate(zip(masks1.tolist(), masks2.tolist())):
+        result[i] = transition(mask1, mask2)
+    return result
+
+
+def count_masks(masks, pattern):
+    """ 对每个掩码，统计掩码`pattern`的 12 种移调中是其子集的数量。 """
+    masks = as_masks(masks)
+    counts = np.zeros(len(masks), dtype=np.int64)
+    if pattern == 0:
+        return counts
+    for offset in range(12):
+        shifted = np.uint16(rotate(pattern, offset))
+        counts += (masks & shifted) == shifted
+    return counts
+
+
+def count_1_many(masks, pattern):
+    """ `Chord.count_1()`的批量版本，对每个和弦统计同一个`pattern`。 """
+    return count_masks(masks, pattern_mask_1(pattern))
+
+
+def count_5_many(masks, pattern):
+    """ `Chord.count_5()`的批量版本，对每个和弦统计同一个`pattern`。 """
+    return count_masks(masks, pattern_mask_5(pattern))
+
+
+def nearest_indices(xs, ys, qs, k):
+    """ 对`qs`中的每个点，返回点集`(xs, ys)`中距离最近的`k`个点的序号。
+
+    返回形状为`(len(qs), k)`的数组，每行按距离从近到远排列，
+    距离相等时序号小的在前，与`KDTree.query`的结果一致。
+    """
+    d2 = (xs - qs[:, :1]) ** 2 + (ys - qs[:, 1:]) ** 2
+    # 第 k 小的距离；小于它的全部入选，等于它的按序号依次补足
+    kth = np.partition(d2, k-1, axis=1)[:, k-1:k]
+    below = d2 < kth
+    ties = d2 == kth
+    need = k - below.sum(axis=1, keepdims=True)
+    selected = below | (ties & (np.cumsum(ties, axis=1) <= need))
+    indexes = np.nonzero(selected)[1].reshape(len(qs), k)
+    order = np.argsort(np.take_along_axis(d2, indexes, axis=1),
+                       axis=1, kind="stable")
+    return np.take_along_axis(indexes, order, axis=1)
+
+
+def sample_nearest(xs, ys, qs, k, picks, block_size=1024):
+    """ 对`qs`中的第`i`个点，返回其最近的`k`个点中的第`picks[i]`个的序号。
+
+    距离矩阵按`block_size`行分块计算，以限制内存占用。
+    """
+    if not (isinstance(block_size, int) and block_size > 0):
+        raise ValueError(f"expected positive block_size, got {block_size}")
+    qs = np.asarray(qs, dtype=np.float64).reshape(-1, 2)
+    result = np.empty(len(qs), dtype=np.intp)
+    for start in range(0, len(qs), block_size):
+        stop = start + block_size
+        indexes = nearest_indices(xs, ys, qs[start:stop], k)
+        result[start:stop] = indexes[np.arange(len(indexes)),
+                                     picks[start:stop]]
+    return result
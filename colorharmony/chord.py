@@ -1,10 +1,72 @@
 from . import Note
+from .circle import CIRCLE_5
+
+
+INTERVAL_WEIGHTS = [
+    0,     # 0  纯一度，占位用
+    0,     # 1  小二度
+    0,     # 2  大二度
+    4,     # 3  小三度
+    4,     # 4  大三度
+    8,     # 5  纯四度
+    0,     # 6  增四度/减五度
+    8,     # 7  纯五度
+    4,     # 8  小六度
+    4,     # 9  大六度
+    0,     # 10 小七度
+    0,     # 11 大七度
+]
+
+FULL_MASK = (1 << 12) - 1
+
+# 预计算的特征表，见`colorharmony.atlas.use_atlas`
+_atlas = None
+
+# 每个 12 位掩码对应的音符值，按升序排列
+_MASK_VALUES = [
+    tuple(i for i in range(12) if mask >> i & 1) for mask in range(1 << 12)
+]
+
+
+def rotate(mask, step):
+    """ 将 12 位掩码中的所有音符向上移动`step`个半音。 """
+    step %= 12
+    return ((mask << step) | (mask >> (12 - step))) & FULL_MASK
+
+
+def notes_mask(notes):
+    """ 一组音符的 12 位掩码。 """
+    mask = 0
+    for note in notes:
+        mask |= 1 << Note(note).value()
+    return mask
+
+
+def submasks(mask, min_size=0, max_size=12):
+    """ 从小到大枚举`mask`的子集中音符数量在`[min_size, max_size]`内的掩码。 """
+    sub = 0
+    while True:
+        if min_size <= sub.bit_count() <= max_size:
+            yield sub
+        sub = (sub - mask) & mask
+        if sub == 0:
+            return
 
 
 class Chord:
+    """ 色彩和声理论中的和弦。
+
+    和弦在内部以一个 12 位整数（掩码）表示，第`i`位为 1 表示和弦中含有
+    值为`i`的音符。
+
+    Attributes
+    ----------
+    __mask : int
+        和弦的 12 位掩码。
+    """
 
     def __init__(self, notes):
-        self.__notes = []
+        mask = 0
         for elem in notes:
             if isinstance(elem, Note):
                 pass
@@ -12,30 +74,84 @@ class Chord:
                 elem = Note(elem)
             else:
                 raise TypeError(f"expected int or Note, got {type(elem)}")
-            self.__notes.append(elem)
+            mask |= 1 << elem.value()
+
+        if mask.bit_count() < 2:
+            raise ValueError(f"expected length >= 2, got {mask.bit_count()}")
+        self.__mask = mask
+
+    @classmethod
+    def from_mask(cls, mask):
+        if not isinstance(mask, int):
+            raise TypeError(f"expected int, got {type(mask)}")
+        if not (0 <= mask <= FULL_MASK):
+            raise ValueError(
+                f"expected mask in range(0, {FULL_MASK + 1}), got {mask}"
+            )
+        if mask.bit_count() < 2:
+            raise ValueError(f"expected length >= 2, got {mask.bit_count()}")
+        chord = cls.__new__(cls)
+        chord.__mask = mask
+        return chord
 
-        self.__notes = sorted(list(set(self.__notes)))
-        if len(self.__notes) < 2:
-            raise ValueError(f"expected length >= 2, got {len(self.__notes)}")
+    def mask(self):
+        return self.__mask
 
     def values(self):
-        return [_.value() for _ in self.__notes]
+        return list(_MASK_VALUES[self.__mask])
+
+    def notes(self):
+        return [Note(_) for _ in _MASK_VALUES[self.__mask]]
 
     def __iter__(self):
-        return iter(self.values())
+        return iter(_MASK_VALUES[self.__mask])
+
+    def __len__(self):
+        return self.__mask.bit_count()
+
+    def __contains__(self, note):
+        return bool(self.__mask >> Note(note).value() & 1)
 
     def __str__(self):
-        return f'"{" ".join([_.name() for _ in self.__notes])}"' \
-               f'({", ".join([str(_.value()) for _ in self.__notes])})'
+        return f'"{" ".join([_.name() for _ in self.notes()])}"' \
+               f'({", ".join([str(_) for _ in self])})'
 
     def __repr__(self):
         return f"<Chord {str(self)}>"
 
     def __eq__(self, other):
-        return self.__notes == other.__notes
+        if not isinstance(other, Chord):
+            return NotImplemented
+        return self.__mask == other.__mask
 
     def __hash__(self):
-        return hash(tuple(self.__notes))
+        return hash(self.__mask)
+
+    def issubset(self, other):
+        if not isinstance(other, Chord):
+            raise TypeError(f"expected Chord, got {type(other)}")
+        return self.__mask & ~other.__mask == 0
+
+    def issuperset(self, other):
+        if not isinstance(other, Chord):
+            raise TypeError(f"expected Chord, got {type(other)}")
+        return other.__mask & ~self.__mask == 0
+
+    def next_1(self, step=1):
+        """ 将和弦中的每个音符都执行`Note.next_1(step)`。 """
+        if not isinstance(step, int):
+            raise TypeError(f"expected int, got {type(step)}")
+        if not (0 <= step < 12):
+            raise ValueError(f"expected step in range(0, 12), got {step}")
+        return Chord.from_mask(rotate(self.__mask, step * 1))
+
+    def next_5(self, step=1):
+        """ 将和弦中的每个音符都执行`Note.next_5(step)`。 """
+        if not isinstance(step, int):
+            raise TypeError(f"expected int, got {type(step)}")
+        if not (0 <= step < 12):
+            raise ValueError(f"expected step in range(0, 12), got {step}")
+        return Chord.from_mask(rotate(self.__mask, step * 5))
 
     def angle_5(self, base_note=Note("C")):
         """ 和弦方向。
@@ -44,9 +160,22 @@ class Chord:
         """
         if not isinstance(base_note, Note):
             raise TypeError(f"expected Note, got {type(base_note)}")
-        notes_in_circle_5 = list(map(lambda x: x.interval_5_to(base_note),
-                                     self.__notes))
-        return sum(notes_in_circle_5) / len(notes_in_circle_5)
+        base = base_note.value()
+        if _atlas is not None:
+            return _atlas.angle_5(self.__mask, base)
+        values = _MASK_VALUES[self.__mask]
+        return sum((_ - base) * 5 % 12 for _ in values) / len(values)
+
+    def interval_vector(self):
+        """ 和弦中各个音程的数量。
+
+        第`i`项等于`self.count_1(i)`，即和弦中相距`i`个半音的有序音符对的数量。
+        """
+        mask = self.__mask
+        if _atlas is not None:
+            return _atlas.interval_vector(mask)
+        return [0] + [(mask & rotate(mask, -i)).bit_count()
+                      for i in range(1, 12)]
 
     def harmony(self):
         """ 和弦协和度。
@@ -62,48 +191,76 @@ class Chord:
         (7, 0)为纯四度，计算加权平均值得协和度为 5.33
         """
         # TODO: 另请参考：《色彩和声》第352页“谱例7-4 和弦紧张度等级划分细则”
-        interval_weights = [
-            0,     # 0  纯一度，占位用
-            0,     # 1  小二度
-            0,     # 2  大二度
-            4,     # 3  小三度
-            4,     # 4  大三度
-            8,     # 5  纯四度
-            0,     # 6  增四度/减五度
-            8,     # 7  纯五度
-            4,     # 8  小六度
-            4,     # 9  大六度
-            0,     # 10 小七度
-            0,     # 11 大七度
-        ]
-        interval_counts = \
-            [self.count_1(_) for _ in range(len(interval_weights))]
+        if _atlas is not None:
+            return _atlas.harmony(self.__mask)
+        interval_counts = self.interval_vector()
         assert interval_counts[0] == 0
         return sum(map(lambda x, y: x*y,
                        interval_counts,
-                       interval_weights)) / sum(interval_counts)
+                       INTERVAL_WEIGHTS)) / sum(interval_counts)
 
     def count_1(self, pattern):
-        if isinstance(pattern, int):
-            if pattern == 0:
-                return 0
-            else:
-                pattern = [0, pattern]
-        pattern = Chord(pattern).values()
-        assert isinstance(pattern, list)
+        """ `pattern`在和弦中出现的次数。
 
-        if len(self.__notes) < len(pattern):
+        `pattern`可以是一个音程（整数），也可以是一组音符，
+        统计`pattern`的 12 种移调中有几种是和弦的子集。
+        """
+        pattern = pattern_mask_1(pattern)
+        if pattern == 0:
             return 0
-
-        pattern = list(map(lambda x: x - min(pattern), pattern))
-        length = len(self.__notes)
-        note_values = [_.value() for _ in self.__notes]
-        counter = 0
-        for offset in range(12):
-            offseted_pattern = map(lambda x: (x + offset) % 12, pattern)
-            if all((_ in note_values) for _ in offseted_pattern):
-                counter += 1
-        return counter
+        return count_mask(self.__mask, pattern)
 
     def count_5(self, pattern):
-        raise NotImplementedError
+        """ 在五度圈中统计`pattern`在和弦中出现的次数。
+
+        与`count_1`相同，但`pattern`中的整数表示音符在五度圈`CIRCLE_5`中的位置，
+        例如`count_5(1)`统计五度圈中相邻的音符对的数量，`count_5([0, 1, 2])`
+        统计五度圈中连续三个音符的数量。`Note`和字符串仍然表示音符本身。
+        """
+        pattern = pattern_mask_5(pattern)
+        if pattern == 0:
+            return 0
+        return count_mask(self.__mask, pattern)
+
+
+def pattern_mask_1(pattern):
+    """ `Chord.count_1`的`pattern`对应的掩码，`pattern`为 0 时返回 0。 """
+    if isinstance(pattern, int):
+        if pattern == 0:
+            return 0
+        else:
+            pattern = [0, pattern]
+    return Chord(pattern).mask()
+
+
+def pattern_mask_5(pattern):
+    """ `Chord.count_5`的`pattern`对应的掩码，`pattern`为 0 时返回 0。 """
+    if isinstance(pattern, int):
+        if pattern == 0:
+            return 0
+        else:
+            pattern = [0, pattern]
+    if isinstance(pattern, Chord):
+        pattern = pattern.notes()
+
+    notes = []
+    for elem in pattern:
+        if isinstance(elem, int):
+            if not (0 <= elem < 12):
+                raise ValueError(
+                    f"expected value in range(0, 12), got {elem}"
+                )
+            elem = CIRCLE_5.get_note(elem)
+        notes.append(elem)
+    return Chord(notes).mask()
+
+
+def count_mask(mask, pattern):
+    """ 掩码`pattern`的 12 种移调中，是掩码`mask`的子集的数量。 """
+    if mask.bit_count() < pattern.bit_count():
+        return 0
+    counter = 0
+    for offset in range(12):
+        if rotate(pattern, offset) & ~mask == 0:
+            counter += 1
+    return counter
@@ -44,6 +44,9 @@ class Circle:
             res['/'.join(notes)] = i
         return res
 
+    def __contains__(self, s):
+        return s in self.__str2value
+
     def value2str(self, v):
         return self.__value2str[v]
 
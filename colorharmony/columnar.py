@@ -0,0 +1,203 @@
+import math
+import random
+
+import numpy as np
+
+from .chord import Chord, FULL_MASK, notes_mask, submasks
+from .container import cartesian
+from .rangeindex import RangeIndex
+from .batch import (as_masks, harmony_many, angle_5_many,
+                    nearest_indices, sample_nearest)
+from .storage import save_columns, load_columns
+
+
+def _readonly(array):
+    array.flags.writeable = False
+    return array
+
+
+class ColumnarContainer:
+    """ 以列存储的和弦容器，接口与`Container`相同。
+
+    和弦以按从小到大排列的`uint16`掩码数组保存，并缓存与之对齐的
+    `harmony()`、`angle_5()`数组；成员判断通过一个 4096 项的位图完成。
+    `add`和`remove`会复制所有的列，为 O(n)，适合批量构建、很少修改的容器。
+    """
+
+    def __init__(self, notes=None, chords=None, seed=None):
+        self.__masks = _readonly(np.empty(0, dtype=np.uint16))
+        self.__harmony = _readonly(np.empty(0, dtype=np.float64))
+        self.__angle_5 = _readonly(np.empty(0, dtype=np.float64))
+        self.__x = np.empty(0, dtype=np.float64)
+        self.__y = np.empty(0, dtype=np.float64)
+        self.__bitmap = np.zeros(FULL_MASK + 1, dtype=bool)
+        self.__ranges = None
+        if notes is not None:
+            self.__extend(list(submasks(notes_mask(notes), 2)))
+        if chords is not None:
+            self.__extend(as_masks(list(chords)))
+        self.__random = random.Random(seed)
+
+    def __extend(self, masks):
+        masks = np.unique(np.asarray(masks, dtype=np.uint16))
+        masks = masks[~self.__bitmap[masks]]
+        if len(masks) == 0:
+            return
+        harmony = harmony_many(masks)
+        angle_5 = angle_5_many(masks)
+        # 与`cartesian`逐个计算，保证和`Container`的结果完全一致
+        x = np.fromiter((r * math.cos(t) for r, t in zip(harmony, angle_5)),
+                        dtype=np.float64, count=len(masks))
+        y = np.fromiter((r * math.sin(t) for r, t in zip(harmony, angle_5)),
+                        dtype=np.float64, count=len(masks))
+
+        all_masks = np.concatenate([self.__masks, masks])
+        order = np.argsort(all_masks, kind="stable")
+        self.__masks = _readonly(all_masks[order])
+        self.__harmony = _readonly(
+            np.concatenate([self.__harmony, harmony])[order])
+        self.__angle_5 = _readonly(
+            np.concatenate([self.__angle_5, angle_5])[order])
+        self.__x = np.concatenate([self.__x, x])[order]
+        self.__y = np.concatenate([self.__y, y])[order]
+        self.__bitmap[masks] = True
+        self.__ranges = None
+
+    def masks(self):
+        """ 按从小到大排列的掩码数组（只读）。 """
+        return self.__masks
+
+    def harmony(self):
+        """ 与`masks()`对齐的`Chord.harmony()`数组（只读）。 """
+        return self.__harmony
+
+    def angle_5(self):
+        """ 与`masks()`对齐的`Chord.angle_5()`数组（只读）。 """
+        return self.__angle_5
+
+    def chords(self):
+        """ 容器中所有和弦组成的`set`（副本），与`Container.chords()`相同。
+
+        只需要掩码时使用`masks()`，不会生成`Chord`对象。
+        """
+        return set(self)
+
+    def __iter__(self):
+        for mask in self.__masks:
+            yield Chord.from_mask(int(mask))
+
+    def __len__(self):
+        return len(self.__masks)
+
+    def __contains__(self, chord):
+        return isinstance(chord, Chord) and bool(self.__bitmap[chord.mask()])
+
+    def add(self, chord):
+        if not isinstance(chord, Chord):
+            raise TypeError(f"expected Chord, got {type(chord)}")
+        self.__extend([chord.mask()])
+
+    def remove(self, chord):
+        if chord not in self:
+            raise KeyError(chord)
+        i = np.searchsorted(self.__masks, chord.mask())
+        self.__masks = _readonly(np.delete(self.__masks, i))
+        self.__harmony = _readonly(np.delete(self.__harmony, i))
+        self.__angle_5 = _readonly(np.delete(self.__angle_5, i))
+        self.__x = np.delete(self.__x, i)
+        self.__y = np.delete(self.__y, i)
+        self.__bitmap[chord.mask()] = False
+        self.__ranges = None
+
+    def add_by_notes(self, notes, num):
+        self.__extend(list(submasks(notes_mask(notes), num, num)))
+
+    def save(self, path, features=True):
+        """ 同`Container.save`。 """
+        columns = None
+        if features:
+            columns = {"harmony": self.__harmony, "angle_5": self.__angle_5,
+                       "x": self.__x, "y": self.__y}
+        return save_columns(path, self.__masks, columns)
+
+    @classmethod
+    def load(cls, path, mmap=True, seed=None):
+        """ 读取`Container.save`或`save`写入的文件。
+
+        `mmap`为`True`时各列直接使用文件的只读内存映射，不复制文件内容；
+        此后的`add`、`remove`会生成新的数组，不会修改文件。
+        文件中没有特征时在读取后计算。
+        """
+        columns = load_columns(path, mmap)
+        if "harmony" not in columns:
+            container = cls(seed=seed)
+            container.__extend(columns["masks"])
+            return container
+        container = cls.__new__(cls)
+        container.__masks = columns["masks"]
+        container.__harmony = columns["harmony"]
+        container.__angle_5 = columns["angle_5"]
+        container.__x = columns["x"]
+        container.__y = columns["y"]
+        container.__bitmap = np.zeros(FULL_MASK + 1, dtype=bool)
+        container.__bitmap[container.__masks] = True
+        container.__ranges = None
+        container.__random = random.Random(seed)
+        return container
+
+    def query(self, harmony=None, angle_5=None, masks=False):
+        """ 同`Container.query`。
+
+        第一次查询时由`harmony()`、`angle_5()`两列建立`RangeIndex`，
+        `add`、`remove`之后重新建立。
+        """
+        if self.__ranges is None:
+            self.__ranges = RangeIndex(zip(self.__harmony.tolist(),
+                                           self.__angle_5.tolist(),
+                                           self.__masks.tolist()))
+        result = self.__ranges.query(harmony, angle_5)
+        if masks:
+            return result
+        return [Chord.from_mask(_) for _ in result]
+
+    def nearest(self, chord, k):
+        """ 和弦空间中距离`chord`最近的`k`个和弦，按距离从近到远排列。
+
+        距离相等的和弦按掩码从小到大排列。
+        """
+        k = min(k, len(self))
+        if k <= 0:
+            return []
+        q = np.asarray([cartesian(chord)], dtype=np.float64)
+        indexes = nearest_indices(self.__x, self.__y, q, k)[0]
+        return [Chord.from_mask(int(_)) for _ in self.__masks[indexes]]
+
+    def infer(self, chord, color, tension, temperature=0.05):
+        # `+1` for not return []
+        k = min(int(temperature*len(self))+1, len(self))
+        return self.__random.choice(self.nearest(chord, k))
+
+    def infer_many(self, chords, temperature=0.05, seed=None,
+                   block_size=1024):
+        """ `infer`的批量版本，参见`Container.infer_many`。 """
+        queries = [cartesian(_) for _ in chords]
+        if not queries:
+            return []
+        if len(self) == 0:
+            raise IndexError("Cannot choose from an empty container")
+        if seed is None:
+            seed = self.__random.getrandbits(64)
+        rng = np.random.default_rng(seed)
+
+        n = len(self)
+        k = min(int(temperature*n)+1, n)
+        picks = rng.integers(0, k, size=len(queries))
+        indexes = sample_nearest(self.__x, self.__y, queries, k, picks,
+                                 block_size)
+        return [Chord.from_mask(int(_)) for _ in self.__masks[indexes]]
+
+    def __str__(self):
+        return '; '.join([str(_) for _ in self])
+
+    def __repr__(self):
+        return f"<ColumnarContainer {self.__str__()}>"
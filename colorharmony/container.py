@@ -1,55 +1,367 @@
+import bisect
+import collections.abc
 import itertools
 import math
 import random
 
 from .note import Note
-from .chord import Chord
+from .chord import Chord, notes_mask, submasks
+from .kdtree import KDTree
+from .rangeindex import RangeIndex
+
+
+def cartesian(chord):
+    """ 和弦在和弦空间中的直角坐标。
+
+    以`harmony()`为模长、`angle_5()`为角度。
+    """
+    r, theta = chord.harmony(), chord.angle_5()
+    return r * math.cos(theta), r * math.sin(theta)
+
+
+class ChordsView(collections.abc.Set):
+    """ 容器中和弦的只读视图，不复制容器中的数据。
+
+    视图随容器变化。与`set`不同，遍历视图时修改容器可能引发`RuntimeError`，
+    需要先用`copy()`得到一个`set`。集合运算的结果是普通的`set`。
+    """
+
+    def __init__(self, container):
+        self.__container = container
+
+    @classmethod
+    def _from_iterable(cls, iterable):
+        return set(iterable)
+
+    def copy(self):
+        """ 容器中所有和弦组成的`set`。 """
+        return set(self)
+
+    def masks(self):
+        return self.__container.masks()
+
+    def __contains__(self, chord):
+        return chord in self.__container
+
+    def __iter__(self):
+        return iter(self.__container)
+
+    def __len__(self):
+        return len(self.__container)
+
+    def __repr__(self):
+        return f"<ChordsView {self.__container}>"
 
 
 class Container:
+    """ 和弦的集合。
+
+    Parameters
+    ----------
+    notes : iterable, optional
+        由这些音符组成的所有和弦（至少 2 个音符）都会加入容器。
+    chords : iterable of Chord, optional
+        加入容器的和弦。
+    seed : optional
+        `infer`使用的随机数种子。
+    lazy : bool
+        为`True`时，`notes`和`add_by_notes`只记录生成和弦所用的音符集合和
+        音符数量范围，成员在需要时才逐个生成，成员判断只需要位运算。
+    """
 
-    def __init__(self, notes=None, chords=None, seed=None):
+    def __init__(self, notes=None, chords=None, seed=None, lazy=False):
         self.__chords = set()
+        self.__lazy = lazy
+        # 惰性模式下的生成规则 (掩码, 最少音符数, 最多音符数)，
+        # 以及从生成规则中删除的和弦的掩码
+        self.__generators = []
+        self.__removed = set()
+        self.__invalidate()
         if notes is not None:
             notes = list(map(lambda x: Note(x), notes))
-            for num in range(2, len(notes)+1):
-                for notes_ in itertools.combinations(notes, num):
-                    self.__chords.add(Chord(notes_))
+            if lazy:
+                self.__generators.append((notes_mask(notes), 2, len(notes)))
+            else:
+                for num in range(2, len(notes)+1):
+                    for notes_ in itertools.combinations(notes, num):
+                        self.__chords.add(Chord(notes_))
         if chords is not None:
             for chord in chords:
-                self.__chords.add(chord)
+                self.add(chord)
         self.__random = random.Random(seed)
 
     def chords(self):
+        """ 容器中所有和弦组成的`set`（副本）。
+
+        惰性模式下返回只读视图`ChordsView`，避免生成全部和弦。
+        """
+        if self.__lazy:
+            return ChordsView(self)
         return self.__chords.copy()
 
+    def masks(self):
+        """ 按从小到大排列的所有和弦的掩码。 """
+        return sorted(self.__iter_masks())
+
+    def __iter_masks(self):
+        for chord in self.__chords:
+            yield chord.mask()
+        for i, (generator, min_size, max_size) in enumerate(self.__generators):
+            for mask in submasks(generator, min_size, max_size):
+                if mask in self.__removed:
+                    continue
+                # 被前面的生成规则覆盖的和弦已经生成过了
+                if self.__generated(mask, self.__generators[:i]):
+                    continue
+                yield mask
+
+    def __iter__(self):
+        for mask in self.__iter_masks():
+            yield Chord.from_mask(mask)
+
+    def __len__(self):
+        if self.__len is None:
+            self.__len = sum(1 for _ in self.__iter_masks())
+        return self.__len
+
+    @staticmethod
+    def __generated(mask, generators):
+        size = mask.bit_count()
+        return any(mask & ~generator == 0 and min_size <= size <= max_size
+                   for generator, min_size, max_size in generators)
+
+    def __contains__(self, chord):
+        if chord in self.__chords:
+            return True
+        if not isinstance(chord, Chord) or chord.mask() in self.__removed:
+            return False
+        return self.__generated(chord.mask(), self.__generators)
+
     def add(self, chord):
-        self.__chords.add(chord)
+        if chord in self:
+            return
+        if self.__generated(chord.mask(), self.__generators):
+            self.__removed.discard(chord.mask())
+        else:
+            self.__chords.add(chord)
+        self.__inserted(chord)
 
     def remove(self, chord):
-        self.__chords.remove(chord)
+        if chord in self.__chords:
+            self.__chords.remove(chord)
+        elif chord in self:
+            self.__removed.add(chord.mask())
+        else:
+            raise KeyError(chord)
+        self.__deleted(chord)
 
     def add_by_notes(self, notes, num):
         notes = list(map(lambda x: Note(x), notes))
-        for notes in itertools.combinations(notes, num):
-            self.__chords.add(Chord(notes))
+        if self.__lazy:
+            if num < 2:
+                raise ValueError(f"expected num >= 2, got {num}")
+            generator = [(notes_mask(notes), num, num)]
+            # 新的生成规则覆盖的和弦不再需要显式保存，也不再是被删除的状态
+            self.__chords = {_ for _ in self.__chords
+                             if not self.__generated(_.mask(), generator)}
+            self.__removed = {_ for _ in self.__removed
+                              if not self.__generated(_, generator)}
+            self.__generators += generator
+        else:
+            for notes in itertools.combinations(notes, num):
+                self.__chords.add(Chord(notes))
+        self.__invalidate()
 
-    def infer(self, chord, color, tension, temperature=0.05):
-        def key(chord2):
-            r1, theta1 = chord.harmony(), chord.angle_5()
-            r2, theta2 = chord2.harmony(), chord2.angle_5()
-            x1 = r1 * math.cos(theta1)
-            y1 = r1 * math.sin(theta1)
-            x2 = r2 * math.cos(theta2)
-            y2 = r2 * math.sin(theta2)
-            return math.sqrt((x1 - x2) ** 2 + (y1 - y2) ** 2)
-        chords = sorted(self.__chords, key=key)
+    def __invalidate(self):
+        self.__len = None
+        self.__points = None
+        self.__index = None
+        self.__ranges = None
+
+    # `add`和`remove`只改动一个和弦，已经建立的缓存和索引原地更新，不再重建。
+    # 有序列表`__points`和`RangeIndex`的插入、删除需要移动后面的元素，为 O(n)，
+    # 但只是一次内存移动，远快于 O(n log n) 的重建；`KDTree`的代价见其说明
+    def __inserted(self, chord):
+        mask = chord.mask()
+        if self.__len is not None:
+            self.__len += 1
+        if self.__points is not None or self.__index is not None:
+            x, y = cartesian(chord)
+            if self.__points is not None:
+                bisect.insort(self.__points, (x, y, chord),
+                              key=lambda _: _[2].mask())
+            if self.__index is not None:
+                self.__index.insert(x, y, chord, key=mask)
+        if self.__ranges is not None:
+            self.__ranges.add(chord.harmony(), chord.angle_5(), mask)
 
+    def __deleted(self, chord):
+        mask = chord.mask()
+        if self.__len is not None:
+            self.__len -= 1
+        if self.__points is not None:
+            i = bisect.bisect_left(self.__points, mask,
+                                   key=lambda _: _[2].mask())
+            del self.__points[i]
+        if self.__index is not None:
+            self.__index.remove(mask)
+        if self.__ranges is not None:
+            self.__ranges.remove(mask)
+
+    def __get_points(self):
+        """ 按掩码排序的`(x, y, chord)`列表。 """
+        if self.__points is None:
+            self.__points = [(*cartesian(_), _)
+                             for _ in map(Chord.from_mask, self.masks())]
+        return self.__points
+
+    def __get_index(self):
+        if self.__index is None:
+            points = self.__get_points()
+            self.__index = KDTree(points, keys=[_[2].mask() for _ in points])
+        return self.__index
+
+    def __get_ranges(self):
+        if self.__ranges is None:
+            self.__ranges = RangeIndex(
+                (_.harmony(), _.angle_5(), _.mask()) for _ in self)
+        return self.__ranges
+
+    def query(self, harmony=None, angle_5=None, masks=False):
+        """ `harmony()`和`angle_5()`在给定范围内的和弦，按掩码从小到大排列。
+
+        第一次查询时建立按两个特征排序的索引，此后每次查询只需要二分查找。
+
+        Parameters
+        ----------
+        harmony : (float, float), optional
+            协和度的闭区间`[low, high]`。
+        angle_5 : (float, float), optional
+            方向的扇区`(start, stop)`，按圆周处理，`start > stop`时跨过 0，
+            见`RangeIndex.query`。
+        masks : bool
+            为`True`时返回掩码而不是`Chord`。
+
+        Returns
+        -------
+        list of Chord or list of int
+        """
+        result = self.__get_ranges().query(harmony, angle_5)
+        if masks:
+            return result
+        return [Chord.from_mask(_) for _ in result]
+
+    def nearest(self, chord, k):
+        """ 和弦空间中距离`chord`最近的`k`个和弦，按距离从近到远排列。
+
+        距离相等的和弦按掩码从小到大排列。
+        """
+        return self.__get_index().query(*cartesian(chord), k)
+
+    def infer(self, chord, color, tension, temperature=0.05):
         # `+1` for not return []
-        return self.__random.choice(chords[:int(temperature*len(chords))+1])
+        k = min(int(temperature*len(self))+1, len(self))
+        return self.__random.choice(self.nearest(chord, k))
+
+    def infer_many(self, chords, temperature=0.05, seed=None,
+                   block_size=1024):
+        """ `infer`的批量版本。
+
+        对每个和弦，候选集与`infer`相同，即和弦空间中距离最近的
+        `int(temperature*len(self))+1`个和弦。距离矩阵按`block_size`行分块计算，
+        所有采样都来自同一个随机数流。
+
+        Parameters
+        ----------
+        chords : iterable of Chord
+            需要推断的和弦。
+        seed : int, optional
+            随机数种子。为`None`时从容器的随机数生成器中取得，
+            因此结果可以由`Container(seed=...)`复现。
+
+        Returns
+        -------
+        list of Chord
+        """
+        import numpy as np
+        from .batch import sample_nearest
+
+        queries = [cartesian(_) for _ in chords]
+        points = self.__get_points()
+        if not queries:
+            return []
+        if not points:
+            raise IndexError("Cannot choose from an empty container")
+        if seed is None:
+            seed = self.__random.getrandbits(64)
+        rng = np.random.default_rng(seed)
+
+        n = len(points)
+        k = min(int(temperature*n)+1, n)
+        xs = np.fromiter((_[0] for _ in points), dtype=np.float64, count=n)
+        ys = np.fromiter((_[1] for _ in points), dtype=np.float64, count=n)
+        qs = np.asarray(queries, dtype=np.float64)
+        picks = rng.integers(0, k, size=len(qs))
+        indexes = sample_nearest(xs, ys, qs, k, picks, block_size)
+        return [points[_][2] for _ in indexes]
+
+    def save(self, path, features=True):
+        """ 把容器中的和弦以`storage`中的二进制格式写入`path`。
+
+        Parameters
+        ----------
+        features : bool
+            为`True`时同时保存`harmony()`、`angle_5()`和和弦空间中的坐标，
+            读取时不需要重新计算。
+        """
+        from .storage import save_columns
+
+        points = self.__get_points()
+        columns = None
+        if features:
+            columns = {
+                "harmony": [_[2].harmony() for _ in points],
+                "angle_5": [_[2].angle_5() for _ in points],
+                "x": [_[0] for _ in points],
+                "y": [_[1] for _ in points],
+            }
+        return save_columns(path, [_[2].mask() for _ in points], columns)
+
+    @classmethod
+    def load(cls, path, mmap=True, seed=None):
+        """ 读取`save`写入的文件。
+
+        Parameters
+        ----------
+        mmap : bool
+            为`True`时返回直接使用文件内存映射的`ColumnarContainer`（接口与
+            `Container`相同，`chords()`也返回`set`副本），不复制文件内容，
+            读取同一文件的多个进程共享内存；为`False`时返回一个新的`Container`。
+
+        Raises
+        ------
+        ValueError
+            文件格式错误，见`storage.load_columns`。
+        seed : optional
+            `infer`使用的随机数种子。
+        """
+        if mmap:
+            from .columnar import ColumnarContainer
+            return ColumnarContainer.load(path, mmap=True, seed=seed)
+
+        from .storage import load_columns
+
+        columns = load_columns(path, mmap=False)
+        container = cls(seed=seed)
+        chords = [Chord.from_mask(_) for _ in columns["masks"].tolist()]
+        container.__chords = set(chords)
+        if "x" in columns:
+            container.__points = list(zip(columns["x"].tolist(),
+                                          columns["y"].tolist(), chords))
+        return container
 
     def __str__(self):
-        return '; '.join([str(_) for _ in self.__chords])
+        return '; '.join([str(_) for _ in self])
 
     def __repr__(self):
         return f"<Container {self.__str__()}>"
@@ -0,0 +1,165 @@
+""" 热点路径的调用次数、耗时和缓存命中率统计。
+
+默认关闭，此时不会有任何额外开销：`enable()`才会把计时包装替换到各个类上，
+`disable()`会恢复原来的实现。
+
+用法::
+
+    from colorharmony import instrument
+
+    with instrument.enabled():
+        container.infer(chord, color, tension)
+    print(instrument.dump_json())
+"""
+import contextlib
+import functools
+import json
+import time
+
+from .note import Note
+from .chord import Chord
+from .container import Container
+from .kdtree import KDTree
+
+
+# (类, 属性名, 统计中使用的名称)
+HOT_PATHS = [
+    (Note, "__new__", "Note.__new__"),
+    (Chord, "__init__", "Chord.__init__"),
+    (Chord, "harmony", "Chord.harmony"),
+    (Chord, "angle_5", "Chord.angle_5"),
+    (Chord, "interval_vector", "Chord.interval_vector"),
+    (Chord, "count_1", "Chord.count_1"),
+    (Chord, "count_5", "Chord.count_5"),
+    (Container, "nearest", "Container.nearest"),
+    (Container, "infer", "Container.infer"),
+    (Container, "infer_many", "Container.infer_many"),
+    (KDTree, "__init__", "KDTree.__init__"),
+    (KDTree, "query", "KDTree.query"),
+]
+
+# (类, 属性名, 统计中使用的名称, 判断是否命中的函数)
+CACHES = [
+    (Container, "_Container__get_points", "Container.points",
+     lambda self: self._Container__points is not None),
+    (Container, "_Container__get_index", "Container.index",
+     lambda self: self._Container__index is not None),
+]
+
+_calls = {}        # 名称 -> [调用次数, 累计秒数]
+_caches = {}       # 名称 -> [命中次数, 未命中次数]
+_originals = []    # (类, 属性名, 原来的属性)
+
+
+def _rewrap(original, wrapper):
+    """ 让`wrapper`与`original`是同一种描述符。 """
+    if isinstance(original, staticmethod):
+        return staticmethod(wrapper)
+    if isinstance(original, classmethod):
+        return classmethod(wrapper)
+    return wrapper
+
+
+def _unwrap(original):
+    if isinstance(original, (staticmethod, classmethod)):
+        return original.__func__
+    return original
+
+
+def _timed(name, func):
+    counter = _calls.setdefault(name, [0, 0.0])
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            counter[0] += 1
+            counter[1] += time.perf_counter() - start
+    return wrapper
+
+
+def _probed(name, func, hit):
+    counter = _caches.setdefault(name, [0, 0])
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        counter[0 if hit(self) else 1] += 1
+        return func(self, *args, **kwargs)
+    return wrapper
+
+
+def is_enabled():
+    return bool(_originals)
+
+
+def enable():
+    """ 开始统计。已经开启时什么也不做。 """
+    if _originals:
+        return
+    for owner, attr, name in HOT_PATHS:
+        original = owner.__dict__[attr]
+        _originals.append((owner, attr, original))
+        setattr(owner, attr,
+                _rewrap(original, _timed(name, _unwrap(original))))
+    for owner, attr, name, hit in CACHES:
+        original = owner.__dict__[attr]
+        _originals.append((owner, attr, original))
+        setattr(owner, attr, _probed(name, original, hit))
+
+
+def disable():
+    """ 停止统计并恢复原来的实现。已经统计的数据会保留。 """
+    while _originals:
+        owner, attr, original = _originals.pop()
+        setattr(owner, attr, original)
+
+
+@contextlib.contextmanager
+def enabled():
+    """ 在`with`语句块中开启统计。 """
+    was_enabled = is_enabled()
+    enable()
+    try:
+        yield
+    finally:
+        if not was_enabled:
+            disable()
+
+
+def reset():
+    """ 清空已经统计的数据。 """
+    for counter in _calls.values():
+        counter[:] = [0, 0.0]
+    for counter in _caches.values():
+        counter[:] = [0, 0]
+
+
+def snapshot():
+    """ 当前统计数据的副本。
+
+    Returns
+    -------
+    dict
+        `{"calls": {名称: {"count", "seconds"}},
+        "caches": {名称: {"hits", "misses", "hit_rate"}}}`，
+        只包含至少发生过一次的项。
+    """
+    calls = {
+        name: {"count": count, "seconds": seconds}
+        for name, (count, seconds) in _calls.items() if count
+    }
+    caches = {
+        name: {"hits": hits, "misses": misses,
+               "hit_rate": hits / (hits + misses)}
+        for name, (hits, misses) in _caches.items() if hits + misses
+    }
+    return {"calls": calls, "caches": caches}
+
+
+def dump_json(fp=None, **kwargs):
+    """ 以 JSON 格式输出`snapshot()`；给出`fp`时写入`fp`，否则返回字符串。 """
+    if fp is None:
+        return json.dumps(snapshot(), **kwargs)
+    json.dump(snapshot(), fp, **kwargs)
@@ -0,0 +1,137 @@
+import heapq
+
+
+class KDTree:
+    """ 二维 KD 树，用于在和弦空间中查找最近邻。
+
+    支持逐个插入和删除：插入的点直接挂到叶子上，删除的点只做标记；
+    插入和删除的次数超过点数的一半时重建整棵树。重建的 O(n log n) 分摊到
+    每次修改上为 O(log n)；插入还需要从根走到叶子，点的顺序随机时为
+    O(log n)，按坐标单调插入时树会退化为链，最坏为 O(n)，直到下一次重建。
+    删除是 O(1)。查询用显式的栈遍历，树的深度不受递归深度限制。
+
+    Parameters
+    ----------
+    points : iterable of (x, y, item)
+        平面上的点及其携带的对象。
+    keys : iterable of int, optional
+        每个点互不相同的键，用于`remove`。距离相等时键小的点排在前面。
+        默认为点的序号，即先出现的点排在前面。
+    """
+
+    def __init__(self, points, keys=None):
+        self.__points = list(points)
+        if keys is None:
+            keys = range(len(self.__points))
+        self.__keys = list(keys)
+        if len(self.__keys) != len(self.__points):
+            raise ValueError(f"expected {len(self.__points)} keys, "
+                             f"got {len(self.__keys)}")
+        self.__positions = {k: i for i, k in enumerate(self.__keys)}
+        if len(self.__positions) != len(self.__keys):
+            raise ValueError("expected unique keys")
+        self.__next_key = max(self.__keys, default=-1) + 1
+        self.__rebuild()
+
+    def __rebuild(self):
+        # 去掉已删除的点后重新建树
+        if len(self.__positions) != len(self.__points):
+            alive = sorted(self.__positions.values())
+            self.__points = [self.__points[i] for i in alive]
+            self.__keys = [self.__keys[i] for i in alive]
+            self.__positions = {k: i for i, k in enumerate(self.__keys)}
+        self.__changes = 0
+        self.__root = self.__build(list(range(len(self.__points))), 0)
+
+    def __build(self, indexes, axis):
+        if not indexes:
+            return None
+        indexes.sort(key=lambda i: self.__points[i][axis])
+        median = len(indexes) // 2
+        return [
+            indexes[median],
+            axis,
+            self.__build(indexes[:median], 1 - axis),
+            self.__build(indexes[median+1:], 1 - axis),
+        ]
+
+    def __len__(self):
+        return len(self.__positions)
+
+    def __contains__(self, key):
+        return key in self.__positions
+
+    def __changed(self):
+        self.__changes += 1
+        if self.__changes > len(self.__positions) // 2 + 16:
+            self.__rebuild()
+
+    def insert(self, x, y, item, key=None):
+        """ 插入一个点，返回它的键。 """
+        if key is None:
+            key = self.__next_key
+        if key in self.__positions:
+            raise ValueError(f"expected a new key, got {key!r}")
+        self.__next_key = max(self.__next_key, key + 1)
+        i = len(self.__points)
+        self.__points.append((x, y, item))
+        self.__keys.append(key)
+        self.__positions[key] = i
+
+        if self.__root is None:
+            self.__root = [i, 0, None, None]
+        else:
+            node = self.__root
+            while True:
+                axis = node[1]
+                side = 2 if (x, y)[axis] < self.__points[node[0]][axis] else 3
+                if node[side] is None:
+                    node[side] = [i, 1 - axis, None, None]
+                    break
+                node = node[side]
+        self.__changed()
+        return key
+
+    def remove(self, key):
+        """ 删除键为`key`的点，不存在时引发`KeyError`。 """
+        del self.__positions[key]
+        self.__changed()
+
+    def query(self, x, y, k):
+        """ 返回距离`(x, y)`最近的`k`个对象，按距离从近到远排列。 """
+        if not isinstance(k, int):
+            raise TypeError(f"expected int, got {type(k)}")
+        if k <= 0:
+            return []
+
+        points = self.__points
+        keys = self.__keys
+        positions = self.__positions
+        # 小根堆中保存 (-距离平方, -键, 序号)，堆顶是当前结果中最差的一个
+        heap = []
+
+        # 栈中保存 (节点, 需要访问它的最小距离平方)，近的子树先出栈，
+        # 远的子树出栈时再按当前结果判断是否需要访问
+        stack = [(self.__root, 0)]
+        while stack:
+            node, bound = stack.pop()
+            if node is None:
+                continue
+            if len(heap) == k and bound > -heap[0][0]:
+                continue
+            i, axis, left, right = node
+            px, py, _ = points[i]
+            key = keys[i]
+            if positions.get(key) == i:
+                entry = (-((px - x) ** 2 + (py - y) ** 2), -key, i)
+                if len(heap) < k:
+                    heapq.heappush(heap, entry)
+                elif entry > heap[0]:
+                    heapq.heapreplace(heap, entry)
+
+            diff = (x - px) if axis == 0 else (y - py)
+            near, far = (left, right) if diff < 0 else (right, left)
+            stack.append((far, diff * diff))
+            stack.append((near, 0))
+
+        return [points[i][2] for _, _, i in sorted(heap, reverse=True)]
@@ -13,12 +13,23 @@ class Note:
     ----------
     __value : int
         在 C 大调中的位置，从 0 开始。
+
+    Notes
+    -----
+    `Note`是不可变的，并且全局只存在 12 个实例，因此可以直接用`is`比较。
     """
 
-    def __init__(self, value):
-        if isinstance(value, str):
-            if value in CIRCLE_1.available_keys:
-                self.__value = CIRCLE_1.str2value(value)
+    __slots__ = ("__value",)
+
+    # 十二个音符各只有一个实例，`Note(...)`总是返回其中之一
+    __cache = [None] * 12
+
+    def __new__(cls, value):
+        if isinstance(value, Note):
+            return value
+        elif isinstance(value, str):
+            if value in CIRCLE_1:
+                value = CIRCLE_1.str2value(value)
             else:
                 raise ValueError(
                     f"expected value in "
@@ -26,17 +37,35 @@ class Note:
                     f"got {value}"
                 )
         elif isinstance(value, int):
-            if 0 <= value < 12:
-                self.__value = value
-            else:
+            if not (0 <= value < 12):
                 raise ValueError(
                     f"expected value in range(0, 12), got {value}"
                 )
-        elif isinstance(value, Note):
-            self.__value = value.__value
         else:
             raise TypeError(f"unsupported type: {type(value)}")
 
+        note = cls.__cache[value]
+        if note is None:
+            note = object.__new__(cls)
+            object.__setattr__(note, "_Note__value", value)
+            cls.__cache[value] = note
+        return note
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __reduce__(self):
+        return (Note, (self.__value,))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
     def __str__(self):
         return f'"{CIRCLE_1.value2str(self.__value)}"({self.__value})'
 
@@ -86,7 +115,7 @@ class Note:
         return Note(value)
 
     def __eq__(self, other):
-        return self.__value == other.__value
+        return self is other
 
     def __gt__(self, other):
         return self.__value > other.__value
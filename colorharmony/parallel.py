@@ -0,0 +1,107 @@
+""" 在进程池中分块计算批量函数，结果直接写入共享内存。
+
+输入和输出数组都放在`multiprocessing.shared_memory`中，各个进程只计算并写入
+自己负责的一段，不需要把结果序列化后传回主进程。每一段的计算与串行调用同一个
+函数完全相同，因此结果与串行执行一致，也与进程数无关。
+"""
+import concurrent.futures
+import traceback
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+def _attach(spec):
+    name, shape, dtype = spec
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def _work(func, inputs, output, start, stop, args):
+    handles = []
+    try:
+        arrays = []
+        for spec in inputs:
+            shm, array = _attach(spec)
+            handles.append(shm)
+            arrays.append(array[start:stop])
+        shm, out = _attach(output)
+        handles.append(shm)
+        out[start:stop] = func(*arrays, *args)
+    except BaseException as e:
+        # traceback 中`func`的帧仍然引用着输入数组
+        traceback.clear_frames(e.__traceback__)
+        raise
+    finally:
+        # 关闭共享内存前需要释放所有引用它的数组，否则 close() 会引发
+        # BufferError，掩盖`func`引发的异常
+        arrays = array = out = None
+        for shm in handles:
+            shm.close()
+    return stop - start
+
+
+def _share(array, handles):
+    array = np.ascontiguousarray(array)
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    handles.append(shm)
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+    return shm.name, array.shape, array.dtype.str
+
+
+def map_chunks(func, inputs, shape, dtype=np.float64, processes=None,
+               chunks=None, args=()):
+    """ 沿第一维把`inputs`分段，在进程池中计算`func(*段, *args)`。
+
+    Parameters
+    ----------
+    func : callable
+        模块级的函数，接受与`inputs`一一对应的数组段，
+        返回可以赋值给输出中对应一段的数组。
+    inputs : list of numpy.ndarray
+        第一维长度都为`shape[0]`的数组。
+    shape : tuple
+        输出数组的形状。
+    processes : int, optional
+        进程数。为`None`或者不大于 1 时直接调用`func(*inputs, *args)`。
+    chunks : int, optional
+        分段数，默认为`4*processes`。
+
+    Returns
+    -------
+    numpy.ndarray
+        普通（非共享）数组。
+    """
+    n = shape[0]
+    if any(len(_) != n for _ in inputs):
+        raise ValueError(f"expected inputs of length {n}, "
+                         f"got {[len(_) for _ in inputs]}")
+    if processes is None or processes <= 1 or n == 0:
+        result = np.empty(shape, dtype=dtype)
+        result[...] = func(*inputs, *args)
+        return result
+    if chunks is None:
+        chunks = 4 * processes
+    bounds = np.linspace(0, n, min(chunks, n) + 1).astype(np.intp)
+
+    handles = []
+    try:
+        specs = [_share(_, handles) for _ in inputs]
+        output = _share(np.empty(shape, dtype=dtype), handles)
+        with concurrent.futures.ProcessPoolExecutor(processes) as executor:
+            futures = [
+                executor.submit(_work, func, specs, output,
+                                int(start), int(stop), args)
+                for start, stop in zip(bounds[:-1], bounds[1:])
+            ]
+            for future in futures:
+                future.result()
+        view = np.ndarray(shape, dtype=dtype, buffer=handles[-1].buf)
+        result = view.copy()
+        del view
+        return result
+    finally:
+        for shm in handles:
+            shm.close()
+            shm.unlink()
+
@@ -0,0 +1,115 @@
+import numpy as np
+
+from .chord import Chord
+from .container import cartesian
+
+
+class ProgressionPlanner:
+    """ 按目标的色彩变化和紧张度变化规划和弦进行。
+
+    从和弦`a`到和弦`b`的一步中，色彩变化为两者在和弦空间中的距离（与
+    `Container.infer`使用的距离相同），紧张度变化为`|b.harmony() - a.harmony()|`。
+    一步的代价为
+
+        color_weight * (色彩变化 - 目标色彩变化) ** 2
+        + tension_weight * (紧张度变化 - 目标紧张度变化) ** 2
+
+    `plan`用集束搜索（Viterbi 算法的剪枝版本）找出总代价最小的和弦进行：
+    每一步对集束中的所有和弦与所有候选和弦一次性计算代价矩阵，
+    每个候选和弦只保留到达它的最优路径，再保留代价最小的`beam_width`个。
+    `beam_width`为`None`时不剪枝，结果是全局最优解。
+
+    Parameters
+    ----------
+    container : Container or ColumnarContainer
+        候选和弦。规划器构造完成后不再跟随容器的变化。
+    """
+
+    def __init__(self, container, beam_width=64, color_weight=1.0,
+                 tension_weight=1.0):
+        if beam_width is not None and not (
+                isinstance(beam_width, int) and beam_width > 0):
+            raise ValueError(f"expected positive beam_width, got {beam_width}")
+        self.masks = np.asarray(container.masks(), dtype=np.uint16)
+        if len(self.masks) == 0:
+            raise ValueError("expected non-empty container")
+        chords = [Chord.from_mask(int(_)) for _ in self.masks]
+        points = np.asarray([cartesian(_) for _ in chords], dtype=np.float64)
+        self.__xs = points[:, 0]
+        self.__ys = points[:, 1]
+        self.__harmony = np.asarray([_.harmony() for _ in chords])
+        self.beam_width = beam_width
+        self.color_weight = color_weight
+        self.tension_weight = tension_weight
+
+    def __step_costs(self, xs, ys, harmony, target):
+        """ 从`(xs, ys, harmony)`中的每个和弦到每个候选和弦的代价矩阵。 """
+        color, tension = target
+        color_change = np.sqrt((self.__xs - xs[:, None]) ** 2
+                               + (self.__ys - ys[:, None]) ** 2)
+        tension_change = np.abs(self.__harmony - harmony[:, None])
+        return self.color_weight * (color_change - color) ** 2 \
+            + self.tension_weight * (tension_change - tension) ** 2
+
+    def plan(self, chord, targets):
+        """ 从`chord`出发，规划与`targets`最接近的和弦进行。
+
+        Parameters
+        ----------
+        chord : Chord
+            出发的和弦，可以不在容器中。
+        targets : sequence of (float, float)
+            每一步的目标（色彩变化, 紧张度变化）。
+
+        Returns
+        -------
+        list of Chord
+            与`targets`等长的和弦进行，不包括出发的和弦。
+        """
+        targets = [tuple(_) for _ in targets]
+        if not targets:
+            return []
+        n = len(self.masks)
+        width = n if self.beam_width is None else min(self.beam_width, n)
+
+        x, y = cartesian(chord)
+        beam = None                                 # 集束中和弦的序号
+        costs = np.zeros(1)                         # 到达集束中和弦的总代价
+        xs, ys = np.asarray([x]), np.asarray([y])
+        harmony = np.asarray([chord.harmony()])
+        parents = []                                # 每一步回溯用的父节点
+        for target in targets:
+            total = costs[:, None] + self.__step_costs(xs, ys, harmony, target)
+            # 每个候选和弦只保留到达它的最优路径
+            parent = np.argmin(total, axis=0)
+            best = total[parent, np.arange(n)]
+            if width < n:
+                keep = np.argpartition(best, width - 1)[:width]
+            else:
+                keep = np.arange(n)
+            keep = keep[np.lexsort((keep, best[keep]))]
+            parents.append((keep, parent[keep]))
+            beam, costs = keep, best[keep]
+            xs, ys = self.__xs[beam], self.__ys[beam]
+            harmony = self.__harmony[beam]
+
+        # 回溯：parents 中保存的是上一步集束中的位置
+        path = []
+        position = 0
+        for keep, parent in reversed(parents):
+            path.append(keep[position])
+            position = parent[position]
+        return [Chord.from_mask(int(self.masks[_])) for _ in reversed(path)]
+
+    def cost(self, chord, progression, targets):
+        """ 和弦进行`progression`相对于`targets`的总代价。 """
+        total = 0.0
+        for next_chord, target in zip(progression, targets, strict=True):
+            x, y = cartesian(chord)
+            x2, y2 = cartesian(next_chord)
+            color = ((x - x2) ** 2 + (y - y2) ** 2) ** 0.5
+            tension = abs(next_chord.harmony() - chord.harmony())
+            total += self.color_weight * (color - target[0]) ** 2 \
+                + self.tension_weight * (tension - target[1]) ** 2
+            chord = next_chord
+        return total
@@ -0,0 +1,108 @@
+import numpy as np
+
+from .chord import Chord
+from .container import cartesian
+from .batch import nearest_indices
+
+
+class ProgressionGenerator:
+    """ 以马尔可夫链生成和弦进行。
+
+    构造时为容器中的每个和弦预先计算`Container.infer`的候选集，
+    即和弦空间中距离最近的`int(temperature*len(container))+1`个和弦，
+    以 CSR 格式保存为转移表。之后每一步只需要一次查表和一次随机采样。
+
+    Parameters
+    ----------
+    container : Container or ColumnarContainer
+        候选和弦。生成器构造完成后不再跟随容器的变化。
+    temperature : float
+        与`Container.infer`的`temperature`相同。
+    seed : optional
+        随机数种子。
+    block_size : int
+        计算转移表时距离矩阵每块的行数。
+
+    Attributes
+    ----------
+    masks : numpy.ndarray
+        容器中所有和弦的掩码，按从小到大排列；转移表中的序号都指向这个数组。
+    indptr, indices : numpy.ndarray
+        CSR 格式的转移表，第`i`个和弦的候选集为
+        `indices[indptr[i]:indptr[i+1]]`，按距离从近到远排列。
+    """
+
+    def __init__(self, container, temperature=0.05, seed=None,
+                 block_size=1024):
+        if not (isinstance(block_size, int) and block_size > 0):
+            raise ValueError(f"expected positive block_size, got {block_size}")
+        self.masks = np.asarray(container.masks(), dtype=np.uint16)
+        n = len(self.masks)
+        if n == 0:
+            raise ValueError("expected non-empty container")
+        self.__k = min(int(temperature*n)+1, n)
+        points = np.asarray(
+            [cartesian(Chord.from_mask(int(_))) for _ in self.masks],
+            dtype=np.float64,
+        )
+        self.__xs = points[:, 0]
+        self.__ys = points[:, 1]
+
+        self.indptr = np.arange(0, n*self.__k + 1, self.__k, dtype=np.intp)
+        self.indices = np.empty(n*self.__k, dtype=np.intp)
+        for start in range(0, n, block_size):
+            stop = min(start + block_size, n)
+            self.indices[start*self.__k:stop*self.__k] = nearest_indices(
+                self.__xs, self.__ys, points[start:stop], self.__k).ravel()
+        for array in [self.masks, self.indptr, self.indices]:
+            array.flags.writeable = False
+
+        self.__lookup = {int(m): i for i, m in enumerate(self.masks)}
+        # 逐步生成时查 Python 列表比索引 NumPy 数组快得多
+        self.__indptr_list = self.indptr.tolist()
+        self.__indices_list = self.indices.tolist()
+        self.__random = np.random.default_rng(seed)
+
+    def __row(self, chord):
+        """ `chord`的候选集在`masks`中的序号。 """
+        i = self.__lookup.get(chord.mask())
+        if i is not None:
+            return self.indices[self.indptr[i]:self.indptr[i+1]]
+        q = np.asarray([cartesian(chord)], dtype=np.float64)
+        return nearest_indices(self.__xs, self.__ys, q, self.__k)[0]
+
+    def candidates(self, chord):
+        """ `chord`的候选集，按距离从近到远排列。 """
+        row = self.__row(chord)
+        return [Chord.from_mask(int(_)) for _ in self.masks[row]]
+
+    def generate_indexes(self, chord, steps, chunk_size=4096):
+        """ 从`chord`出发走`steps`步，逐个产生每一步和弦在`masks`中的序号。
+
+        不包括出发的和弦本身。`chord`可以不在容器中。
+        """
+        state = self.__lookup.get(chord.mask())
+        if state is None and steps > 0:
+            state = int(self.__random.choice(self.__row(chord)))
+            yield state
+            steps -= 1
+
+        indptr = self.__indptr_list
+        indices = self.__indices_list
+        for start in range(0, steps, chunk_size):
+            for u in self.__random.random(min(chunk_size, steps - start)) \
+                    .tolist():
+                begin = indptr[state]
+                state = indices[begin + int(u * (indptr[state+1] - begin))]
+                yield state
+
+    def generate(self, chord, steps):
+        """ 从`chord`出发生成`steps`个和弦，逐个产生。 """
+        for i in self.generate_indexes(chord, steps):
+            yield Chord.from_mask(int(self.masks[i]))
+
+    def generate_masks(self, chord, steps):
+        """ 从`chord`出发生成`steps`个和弦，返回其掩码数组。 """
+        indexes = np.fromiter(self.generate_indexes(chord, steps),
+                              dtype=np.intp, count=max(steps, 0))
+        return self.masks[indexes]
@@ -0,0 +1,124 @@
+import bisect
+
+
+ANGLE_PERIOD = 12
+
+
+def _sector(start, stop):
+    """ 把扇区的两端对 12 取模，整个圆周返回`None`。 """
+    if stop - start >= ANGLE_PERIOD:
+        return None
+    return start % ANGLE_PERIOD, stop % ANGLE_PERIOD
+
+
+class RangeIndex:
+    """ 按`harmony`和`angle_5`排序的和弦索引，用于区间查询。
+
+    两个特征各有一个按`(特征值, 掩码)`排序的列表，区间查询用二分查找确定范围，
+    时间为 O(log n + 结果数量)。`add`和`remove`用二分查找定位后在列表中插入、
+    删除，需要移动后面的元素，为 O(n)。`angle_5`的取值范围是`[0, 12)`，
+    按圆周处理。
+
+    Parameters
+    ----------
+    items : iterable
+        `(harmony, angle_5, mask)`。
+    """
+
+    def __init__(self, items=()):
+        self.__features = {}
+        self.__harmony = []
+        self.__angle = []
+        for harmony, angle, mask in items:
+            self.__features[mask] = (harmony, angle % ANGLE_PERIOD)
+        for mask, (harmony, angle) in self.__features.items():
+            self.__harmony.append((harmony, mask))
+            self.__angle.append((angle, mask))
+        self.__harmony.sort()
+        self.__angle.sort()
+
+    def __len__(self):
+        return len(self.__features)
+
+    def __contains__(self, mask):
+        return mask in self.__features
+
+    def add(self, harmony, angle, mask):
+        """ 加入一个和弦，已经存在时什么也不做。 """
+        if mask in self.__features:
+            return
+        angle %= ANGLE_PERIOD
+        self.__features[mask] = (harmony, angle)
+        bisect.insort(self.__harmony, (harmony, mask))
+        bisect.insort(self.__angle, (angle, mask))
+
+    def remove(self, mask):
+        """ 删除一个和弦，不存在时引发`KeyError`。 """
+        harmony, angle = self.__features.pop(mask)
+        del self.__harmony[bisect.bisect_left(self.__harmony, (harmony, mask))]
+        del self.__angle[bisect.bisect_left(self.__angle, (angle, mask))]
+
+    @staticmethod
+    def __between(items, low, high):
+        """ `items`中特征值在`[low, high]`内的部分的下标范围。 """
+        start = bisect.bisect_left(items, low, key=lambda _: _[0])
+        stop = bisect.bisect_right(items, high, key=lambda _: _[0])
+        return start, max(start, stop)
+
+    def __band_ranges(self, low, high):
+        return [(self.__harmony, *self.__between(self.__harmony, low, high))]
+
+    def __sector_ranges(self, start, stop):
+        if start <= stop:
+            return [(self.__angle, *self.__between(self.__angle, start, stop))]
+        # 跨过 0 的扇区分为两段
+        return [
+            (self.__angle, *self.__between(self.__angle, start, ANGLE_PERIOD)),
+            (self.__angle, *self.__between(self.__angle, 0, stop)),
+        ]
+
+    def query(self, harmony=None, angle=None):
+        """ 同时满足两个条件的和弦的掩码，按从小到大排列。
+
+        Parameters
+        ----------
+        harmony : (float, float), optional
+            `harmony`的闭区间`[low, high]`。
+        angle : (float, float), optional
+            `angle_5`的扇区，从`start`按角度增大的方向到`stop`（含两端），
+            `start > stop`时跨过 0，如`(11, 1)`。两端都先对 12 取模，
+            `stop - start >= 12`时为整个圆周。
+
+        Returns
+        -------
+        list of int
+        """
+        if angle is not None:
+            angle = _sector(*angle)
+        candidates = []
+        if harmony is not None:
+            candidates.append(self.__band_ranges(*harmony))
+        if angle is not None:
+            candidates.append(self.__sector_ranges(*angle))
+        if not candidates:
+            return sorted(self.__features)
+
+        # 从结果较少的条件出发，再用另一个条件逐个检查
+        candidates.sort(key=lambda ranges: sum(b - a for _, a, b in ranges))
+        masks = [mask for items, a, b in candidates[0]
+                 for _, mask in items[a:b]]
+        if len(candidates) > 1:
+            low, high = harmony
+            start, stop = angle
+            masks = [
+                _ for _ in masks
+                if low <= self.__features[_][0] <= high
+                and self.__in_sector(self.__features[_][1], start, stop)
+            ]
+        return sorted(masks)
+
+    @staticmethod
+    def __in_sector(angle, start, stop):
+        if start <= stop:
+            return start <= angle <= stop
+        return angle >= start or angle <= stop
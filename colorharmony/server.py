@@ -0,0 +1,424 @@
+""" 基于 asyncio 的本地推断服务。
+
+只使用标准库，通过 HTTP（TCP 或 Unix 套接字）收发 JSON。服务在内存中保存预先
+加载的容器，在`window`秒内到达的`infer`请求会按容器和`temperature`合并，
+一次调用`infer_many`完成。`infer_many`在线程池中依次执行，不阻塞事件循环。
+
+接口::
+
+    POST /infer       {"chord": ["C", "E", "G"], "container": "default",
+                       "temperature": 0.05}
+                      或者用"chords"给出一组和弦
+    GET  /containers  各个容器的大小
+    GET  /stats       请求数、批次数、延迟和吞吐量
+
+用法::
+
+    python -m colorharmony.server --port 8000 --container major=0,2,4,5,7,9,11
+"""
+import asyncio
+import collections
+import functools
+import json
+import math
+import sys
+import time
+
+from .chord import Chord
+from .container import Container
+from .stream import parse_line
+
+
+DEFAULT_CONTAINER = "default"
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found",
+            405: "Method Not Allowed", 500: "Internal Server Error"}
+
+
+def _parse_chord(value):
+    """ 和弦可以是音符的列表，也可以是`stream.parse_line`格式的字符串。 """
+    if isinstance(value, str):
+        chord = parse_line(value)
+        if chord is None:
+            raise ValueError(f"expected a chord, got {value!r}")
+        return chord
+    return Chord(value)
+
+
+def _chord_json(chord):
+    return {"values": chord.values(), "mask": chord.mask(),
+            "notes": [_.name() for _ in chord.notes()]}
+
+
+class InferenceServer:
+    """ 合并并发请求的推断服务。
+
+    Parameters
+    ----------
+    containers : Container or dict
+        单个容器（名为`"default"`），或者名称到容器的字典。
+        容器需要提供`infer_many`，如`Container`或`ColumnarContainer`。
+    window : float
+        收到第一个请求后等待更多请求的秒数。
+    max_batch : int
+        一批中最多的请求数，达到后立即处理。
+    """
+
+    def __init__(self, containers, window=0.002, max_batch=1024):
+        if not isinstance(containers, dict):
+            containers = {DEFAULT_CONTAINER: containers}
+        if window < 0:
+            raise ValueError(f"expected window >= 0, got {window}")
+        if max_batch <= 0:
+            raise ValueError(f"expected max_batch > 0, got {max_batch}")
+        self.containers = containers
+        self.window = window
+        self.max_batch = max_batch
+        self.__pending = []
+        self.__flush_handle = None
+        # 同一时间只有一批在线程池中计算，容器不需要是线程安全的
+        self.__lock = asyncio.Lock()
+        self.__tasks = set()
+        self.__started = time.perf_counter()
+        self.__requests = 0
+        self.__batches = 0
+        self.__errors = 0
+        self.__latencies = collections.deque(maxlen=10000)
+
+    async def infer(self, chord, container=DEFAULT_CONTAINER,
+                    temperature=0.05):
+        """ 与同一时间窗内的其他请求合并后，返回`infer`的结果。 """
+        if container not in self.containers:
+            raise KeyError(container)
+        if not isinstance(chord, Chord):
+            chord = Chord(chord)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.__pending.append(((container, temperature), chord, future,
+                               time.perf_counter()))
+        if len(self.__pending) >= self.max_batch:
+            self.__flush()
+        elif self.__flush_handle is None:
+            self.__flush_handle = loop.call_later(self.window, self.__flush)
+        return await future
+
+    def __flush(self):
+        if self.__flush_handle is not None:
+            self.__flush_handle.cancel()
+            self.__flush_handle = None
+        pending, self.__pending = self.__pending, []
+        groups = {}
+        for item in pending:
+            groups.setdefault(item[0], []).append(item)
+        loop = asyncio.get_running_loop()
+        for key, items in groups.items():
+            self.__batches += 1
+            task = loop.create_task(self.__run_batch(*key, items))
+            # 事件循环只保存任务的弱引用
+            self.__tasks.add(task)
+            task.add_done_callback(self.__tasks.discard)
+
+    async def __run_batch(self, name, temperature, items):
+        infer_many = functools.partial(
+            self.containers[name].infer_many, [_[1] for _ in items],
+            temperature=temperature)
+        try:
+            async with self.__lock:
+                results = await asyncio.get_running_loop().run_in_executor(
+                    None, infer_many)
+        except Exception as e:
+            self.__errors += len(items)
+            for _, _, future, _ in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        now = time.perf_counter()
+        for (_, _, future, start), result in zip(items, results):
+            self.__requests += 1
+            self.__latencies.append(now - start)
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self):
+        """ 服务启动以来的统计数据。
+
+        Returns
+        -------
+        dict
+            `requests`、`batches`、`errors`、`mean_batch_size`、
+            `throughput`（每秒完成的请求数），以及最近 10000 个请求的延迟
+            `latency`（秒）：`mean`、`p50`、`p90`、`p99`、`max`。
+        """
+        elapsed = time.perf_counter() - self.__started
+        latencies = sorted(self.__latencies)
+        if latencies:
+            def percentile(q):
+                return latencies[min(int(q * len(latencies)),
+                                     len(latencies) - 1)]
+            latency = {
+                "mean": sum(latencies) / len(latencies),
+                "p50": percentile(0.5),
+                "p90": percentile(0.9),
+                "p99": percentile(0.99),
+                "max": latencies[-1],
+            }
+        else:
+            latency = {}
+        return {
+            "requests": self.__requests,
+            "batches": self.__batches,
+            "errors": self.__errors,
+            "mean_batch_size":
+                self.__requests / self.__batches if self.__batches else 0.0,
+            "throughput": self.__requests / elapsed if elapsed else 0.0,
+            "latency": latency,
+        }
+
+    async def handle(self, method, path, body):
+        """ 处理一个 HTTP 请求，返回`(状态码, JSON 对象)`。 """
+        if path == "/stats":
+            if method != "GET":
+                return 405, {"error": f"expected GET, got {method}"}
+            return 200, self.stats()
+        if path == "/containers":
+            if method != "GET":
+                return 405, {"error": f"expected GET, got {method}"}
+            return 200, {k: len(v) for k, v in self.containers.items()}
+        if path != "/infer":
+            return 404, {"error": f"unknown path {path}"}
+        if method != "POST":
+            return 405, {"error": f"expected POST, got {method}"}
+
+        try:
+            request = json.loads(body or b"{}")
+            if not isinstance(request, dict):
+                raise TypeError(f"expected object, got {type(request)}")
+            name = request.get("container", DEFAULT_CONTAINER)
+            if not isinstance(name, str):
+                raise TypeError(f"expected container name of type str, "
+                                f"got {type(name).__name__}")
+            temperature = float(request.get("temperature", 0.05))
+            if not (math.isfinite(temperature) and temperature >= 0):
+                raise ValueError(f"expected finite temperature >= 0, "
+                                 f"got {temperature}")
+            # 大于 1 时候选集都是整个容器，避免 temperature*len 溢出
+            temperature = min(temperature, 1.0)
+            if "chords" in request:
+                chords = [_parse_chord(_) for _ in request["chords"]]
+            else:
+                chords = [_parse_chord(request["chord"])]
+        except (TypeError, ValueError, KeyError) as e:
+            return 400, {"error": str(e) or repr(e)}
+        if name not in self.containers:
+            return 404, {"error": f"unknown container {name!r}"}
+
+        try:
+            results = await asyncio.gather(
+                *[self.infer(_, name, temperature) for _ in chords])
+        except (TypeError, ValueError, IndexError) as e:
+            return 400, {"error": str(e)}
+        if "chords" in request:
+            return 200, {"chords": [_chord_json(_) for _ in results]}
+        return 200, {"chord": _chord_json(results[0])}
+
+    @staticmethod
+    async def __respond(writer, status, payload, close):
+        data = json.dumps(payload).encode()
+        writer.write(
+            f"HTTP/1.1 {status} {_REASONS[status]}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"Connection: {'close' if close else 'keep-alive'}\r\n"
+            f"\r\n".encode() + data
+        )
+        await writer.drain()
+
+    @staticmethod
+    async def __read_request(reader):
+        """ 读取一个请求，返回`(方法, 路径, 头部, 正文)`，连接已关闭时返回`None`。
+
+        Raises
+        ------
+        ValueError
+            请求行、头部或者`Content-Length`格式错误。
+        """
+        line = await reader.readline()
+        if not line.strip():
+            return None
+        parts = line.decode("latin-1").split()
+        if len(parts) != 3 or not parts[2].startswith("HTTP/"):
+            raise ValueError(f"expected request line, got {line!r}")
+        method, target, _ = parts
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if not line.strip():
+                break
+            key, sep, value = line.decode("latin-1").partition(":")
+            if not sep or not key.strip():
+                raise ValueError(f"expected header, got {line!r}")
+            headers[key.strip().lower()] = value.strip()
+        length = headers.get("content-length", "0")
+        if not length.isdigit():
+            raise ValueError(f"expected Content-Length >= 0, got {length!r}")
+        length = int(length)
+        body = await reader.readexactly(length) if length else b""
+        return method, target, headers, body
+
+    async def __serve_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await self.__read_request(reader)
+                except ValueError as e:
+                    # 无法确定请求的边界，回复后关闭连接
+                    await self.__respond(writer, 400, {"error": str(e)}, True)
+                    break
+                if request is None:
+                    break
+                method, target, headers, body = request
+
+                try:
+                    status, payload = await self.handle(
+                        method, target.split("?")[0], body)
+                except Exception as e:
+                    status, payload = 500, {"error": repr(e)}
+                close = headers.get("connection", "").lower() == "close"
+                await self.__respond(writer, status, payload, close)
+                if close:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host="127.0.0.1", port=0, path=None):
+        """ 开始监听，返回`asyncio.Server`。
+
+        给出`path`时监听该 Unix 套接字，否则监听`host:port`，
+        `port`为 0 时由系统分配。
+        """
+        if path is not None:
+            return await asyncio.start_unix_server(self.__serve_connection,
+                                                   path)
+        return await asyncio.start_server(self.__serve_connection, host, port)
+
+
+class InferenceClient:
+    """ `InferenceServer`的异步客户端，复用同一个连接。
+
+    Parameters
+    ----------
+    host, port : optional
+        服务的 TCP 地址。
+    path : str, optional
+        服务的 Unix 套接字路径，给出时忽略`host`和`port`。
+    """
+
+    def __init__(self, host="127.0.0.1", port=None, path=None):
+        self.host = host
+        self.port = port
+        self.path = path
+        self.__reader = None
+        self.__writer = None
+        self.__lock = asyncio.Lock()
+
+    async def __connect(self):
+        if self.path is not None:
+            return await asyncio.open_unix_connection(self.path)
+        return await asyncio.open_connection(self.host, self.port)
+
+    async def request(self, method, path, payload=None):
+        """ 发送一个请求，返回`(状态码, JSON 对象)`。 """
+        body = b"" if payload is None else json.dumps(payload).encode()
+        async with self.__lock:
+            if self.__writer is None:
+                self.__reader, self.__writer = await self.__connect()
+            self.__writer.write(
+                f"{method} {path} HTTP/1.1\r\n"
+                f"Host: {self.host}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"\r\n".encode() + body
+            )
+            await self.__writer.drain()
+            status = int((await self.__reader.readline()).split()[1])
+            headers = {}
+            while True:
+                line = await self.__reader.readline()
+                if not line.strip():
+                    break
+                key, _, value = line.decode("latin-1").partition(":")
+                headers[key.strip().lower()] = value.strip()
+            data = await self.__reader.readexactly(
+                int(headers["content-length"]))
+        return status, json.loads(data)
+
+    async def infer(self, chord, container=DEFAULT_CONTAINER,
+                    temperature=0.05):
+        """ 返回服务推断出的`Chord`。
+
+        Raises
+        ------
+        RuntimeError
+            服务返回了错误。
+        """
+        if isinstance(chord, Chord):
+            chord = chord.values()
+        status, payload = await self.request(
+            "POST", "/infer",
+            {"chord": list(chord), "container": container,
+             "temperature": temperature},
+        )
+        if status != 200:
+            raise RuntimeError(f"{status}: {payload['error']}")
+        return Chord.from_mask(payload["chord"]["mask"])
+
+    async def stats(self):
+        return (await self.request("GET", "/stats"))[1]
+
+    async def close(self):
+        if self.__writer is not None:
+            self.__writer.close()
+            await self.__writer.wait_closed()
+            self.__reader = self.__writer = None
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--unix", metavar="PATH", help="监听这个 Unix 套接字")
+    parser.add_argument("--container", action="append", default=[],
+                        metavar="NAME=NOTES",
+                        help="加载由这些音符（以逗号分隔）组成的所有和弦，"
+                             "可以重复；默认加载由 12 个音符组成的容器 default")
+    parser.add_argument("--window", type=float, default=0.002,
+                        help="合并请求的时间窗（秒）")
+    parser.add_argument("--max-batch", type=int, default=1024)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    containers = {}
+    for spec in args.container or [f"{DEFAULT_CONTAINER}=" + ",".join(
+            map(str, range(12)))]:
+        name, _, notes = spec.partition("=")
+        notes = [int(_) if _.isdigit() else _ for _ in notes.split(",")]
+        containers[name] = Container(notes=notes, seed=args.seed)
+    server = InferenceServer(containers, args.window, args.max_batch)
+
+    async def serve():
+        listener = await server.start(args.host, args.port, args.unix)
+        async with listener:
+            await listener.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+""" 容器的二进制文件格式。
+
+文件由以下几部分依次组成::
+
+    文件头      CONTAINER_HEADER：魔数、版本、和弦数量、标志
+    掩码        按从小到大排列的 uint16 数组
+    特征（可选） harmony、angle_5、x、y 四个 float64 数组，起始位置按 8 字节对齐
+
+所有数组都可以直接内存映射，多个进程读取同一个文件时共享同一份物理内存。
+"""
+import struct
+
+import numpy as np
+
+from .chord import FULL_MASK
+
+
+CONTAINER_VERSION = 1
+CONTAINER_MAGIC = b"CHCHORDS"
+CONTAINER_HEADER = struct.Struct("<8sIII4x")
+FLAG_FEATURES = 1
+FEATURES = ["harmony", "angle_5", "x", "y"]
+
+
+def _features_offset(count):
+    offset = CONTAINER_HEADER.size + 2 * count
+    return (offset + 7) // 8 * 8
+
+
+def _check_masks(masks):
+    """ 掩码需要严格递增，并且每个和弦至少有 2 个音符。 """
+    if np.any((masks < 0) | (masks > FULL_MASK)):
+        raise ValueError(f"expected mask in range(0, {FULL_MASK + 1})")
+    if np.any(masks[1:] <= masks[:-1]):
+        raise ValueError("expected strictly increasing masks")
+    # 不超过 1 个比特的掩码满足 m & (m - 1) == 0
+    if np.any(masks & (masks - 1) == 0):
+        raise ValueError("expected length >= 2 for every chord")
+
+
+def save_columns(path, masks, features=None):
+    """ 把掩码和可选的特征列写入`path`。
+
+    Parameters
+    ----------
+    masks : array_like
+        按从小到大排列、互不相同的掩码，每个和弦至少有 2 个音符。
+    features : dict, optional
+        键为`FEATURES`，值为与`masks`对齐的数组。
+    """
+    masks = np.asarray(masks)
+    if masks.ndim != 1:
+        raise ValueError(f"expected 1 dimension, got {masks.ndim}")
+    _check_masks(masks.astype(np.int64))
+    masks = masks.astype("<u2")
+    count = len(masks)
+    flags = 0 if features is None else FLAG_FEATURES
+    with open(path, "wb") as f:
+        f.write(CONTAINER_HEADER.pack(CONTAINER_MAGIC, CONTAINER_VERSION,
+                                      count, flags))
+        f.write(masks.tobytes())
+        if features is not None:
+            f.write(b"\0" * (_features_offset(count) - f.tell()))
+            for name in FEATURES:
+                column = np.asarray(features[name], dtype="<f8")
+                if column.shape != (count,):
+                    raise ValueError(f"expected {name} of shape ({count},), "
+                                     f"got {column.shape}")
+                f.write(column.tobytes())
+    return path
+
+
+def load_columns(path, mmap=True):
+    """ 读取`save_columns`写入的文件。
+
+    Parameters
+    ----------
+    mmap : bool
+        为`True`时返回只读的内存映射数组，不复制文件内容。
+
+    Returns
+    -------
+    dict
+        `"masks"`，以及文件中含有特征时的`FEATURES`中的各列。
+
+    Raises
+    ------
+    ValueError
+        文件不是容器文件，版本与`CONTAINER_VERSION`不一致，
+        或者掩码不满足`save_columns`的要求。
+    """
+    with open(path, "rb") as f:
+        header = f.read(CONTAINER_HEADER.size)
+    if len(header) != CONTAINER_HEADER.size:
+        raise ValueError(f"expected container file, got {path}")
+    magic, version, count, flags = CONTAINER_HEADER.unpack(header)
+    if magic != CONTAINER_MAGIC:
+        raise ValueError(f"expected container file, got {path}")
+    if version != CONTAINER_VERSION:
+        raise ValueError(
+            f"expected container version {CONTAINER_VERSION}, got {version}"
+        )
+
+    def read(dtype, offset, count):
+        if count == 0:
+            return np.empty(0, dtype=dtype)
+        if mmap:
+            return np.memmap(path, dtype=dtype, mode="r", offset=offset,
+                             shape=(count,))
+        array = np.fromfile(path, dtype=dtype, offset=offset, count=count)
+        array.flags.writeable = False
+        return array
+
+    columns = {"masks": read("<u2", CONTAINER_HEADER.size, count)}
+    _check_masks(columns["masks"].astype(np.int64))
+    if flags & FLAG_FEATURES:
+        offset = _features_offset(count)
+        for name in FEATURES:
+            columns[name] = read("<f8", offset, count)
+            offset += 8 * count
+    return columns
@@ -0,0 +1,266 @@
+""" 流式分析和弦序列文件。
+
+输入文件每行一个和弦，支持三种格式：
+
+- `"text"`：音名以空白或逗号分隔，如`C E G`；
+- `"csv"`：每个单元格一个音名，如`C,E,G`；
+- `"jsonl"`：每行一个 JSON 数组（如`["C", "E", "G"]`），
+  或者含有`"notes"`数组的对象。
+
+空行会被跳过。每个和弦输出一行结果，包括`harmony`、`angle_5`，以及与前一个和弦
+之间按`colorChord`计算的色彩变化、紧张度变化和新鲜度。整个过程都是生成器，
+内存占用与输入文件大小无关。
+
+用法::
+
+    python -m colorharmony.stream chords.txt -o result.csv -j 4
+"""
+import concurrent.futures
+import csv
+import functools
+import itertools
+import json
+import os
+import re
+import sys
+
+from .chord import Chord
+
+
+FORMATS = ["text", "csv", "jsonl"]
+FIELDS = ["notes", "mask", "harmony", "angle_5",
+          "color", "tension", "freshness"]
+
+_SEPARATOR = re.compile(r"[\s,]+")
+
+
+def guess_format(path):
+    """ 根据扩展名判断文件格式，无法判断时为`"text"`。 """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        return "csv"
+    if ext in (".jsonl", ".ndjson"):
+        return "jsonl"
+    return "text"
+
+
+def parse_line(line, format="text"):
+    """ 把一行文本解析为和弦，空行返回`None`。 """
+    line = line.strip()
+    if not line:
+        return None
+    if format == "text":
+        notes = _SEPARATOR.split(line)
+    elif format == "csv":
+        notes = [_.strip() for _ in next(csv.reader([line])) if _.strip()]
+    elif format == "jsonl":
+        notes = None
+    else:
+        raise ValueError(f"expected format in {FORMATS}, got {format!r}")
+    try:
+        if notes is None:
+            notes = json.loads(line)
+            if isinstance(notes, dict):
+                notes = notes["notes"]
+            if not isinstance(notes, list):
+                raise TypeError(f"expected a JSON array of notes, "
+                                f"got {type(notes).__name__}")
+        return Chord(notes)
+    except (TypeError, ValueError, KeyError) as e:
+        raise ValueError(f"expected a chord, got {line!r}") from e
+
+
+def read_chords(lines, format="text"):
+    """ 逐行解析`lines`，依次生成其中的和弦。 """
+    for line in lines:
+        chord = parse_line(line, format)
+        if chord is not None:
+            yield chord
+
+
+@functools.lru_cache(maxsize=None)
+def _legacy_chord(mask):
+    import colorChord
+    chord = colorChord.Chord.init_by_pitch_class_mask(mask)
+    # 与 colorChord.get_pair_matrices 一样，使用已经调用过 get_theta() 的和弦
+    chord.get_theta()
+    return chord
+
+
+def transition(mask1, mask2):
+    """ 从`mask1`到`mask2`的色彩变化、紧张度变化和新鲜度。
+
+    结果与`colorChord.get_pair_matrices`中的一项相同（`float64`精度）。
+    """
+    import colorChord
+    chord1 = _legacy_chord(mask1)
+    chord2 = _legacy_chord(mask2)
+    color = colorChord.Chord.get_color_change色彩变化(chord1, chord2)
+    tension = colorChord.Chord.get_tension_change紧张度变化(chord1, chord2)
+    return color, tension, tension + color
+
+
+def analyze(chords, previous=None):
+    """ 依次生成每个和弦的分析结果。
+
+    Parameters
+    ----------
+    chords : iterable of Chord
+    previous : Chord, optional
+        `chords`之前的一个和弦，用于计算第一个和弦的变化量。
+
+    Returns
+    -------
+    generator of dict
+        键为`FIELDS`。没有前一个和弦时，`color`、`tension`和`freshness`为`None`。
+    """
+    previous = None if previous is None else previous.mask()
+    for chord in chords:
+        mask = chord.mask()
+        if previous is None:
+            change = (None, None, None)
+        else:
+            change = transition(previous, mask)
+        yield {
+            "notes": " ".join([_.name() for _ in chord.notes()]),
+            "mask": mask,
+            "harmony": chord.harmony(),
+            "angle_5": chord.angle_5(),
+            "color": change[0],
+            "tension": change[1],
+            "freshness": change[2],
+        }
+        previous = mask
+
+
+def _chunks(path, chunk_size):
+    """ 把文件按行的边界切分为大约`chunk_size`字节的区间`(start, end)`。 """
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        start = 0
+        while start < size:
+            f.seek(min(start + chunk_size, size))
+            f.readline()
+            end = min(f.tell(), size)
+            yield start, end
+            start = end
+
+
+def _analyze_chunk(path, format, start, end):
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    lines = data.decode("utf-8").splitlines()
+    return list(analyze(read_chords(lines, format)))
+
+
+def analyze_file(path, format=None, processes=None, chunk_size=1 << 20):
+    """ 逐行分析和弦序列文件。
+
+    Parameters
+    ----------
+    format : str, optional
+        `FORMATS`之一，默认由扩展名决定。
+    processes : int, optional
+        大于 1 时，把文件按`chunk_size`字节切块后用这么多个进程并行分析。
+        同时处理中的块不超过`2*processes`个，结果的顺序与输入相同。
+
+    Returns
+    -------
+    generator of dict
+        同`analyze`。
+    """
+    if format is None:
+        format = guess_format(path)
+    if format not in FORMATS:
+        raise ValueError(f"expected format in {FORMATS}, got {format!r}")
+    if chunk_size <= 0:
+        raise ValueError(f"expected chunk_size > 0, got {chunk_size}")
+
+    if processes is None or processes <= 1:
+        with open(path, encoding="utf-8") as f:
+            yield from analyze(read_chords(f, format))
+        return
+
+    with concurrent.futures.ProcessPoolExecutor(processes) as executor:
+        chunks = _chunks(path, chunk_size)
+        pending = [
+            executor.submit(_analyze_chunk, path, format, *_)
+            for _ in itertools.islice(chunks, 2 * processes)
+        ]
+        previous = None
+        while pending:
+            rows = pending.pop(0).result()
+            for chunk in itertools.islice(chunks, 1):
+                pending.append(
+                    executor.submit(_analyze_chunk, path, format, *chunk))
+            if rows and previous is not None:
+                # 每块的第一个和弦与上一块的最后一个和弦之间的变化
+                color, tension, freshness = transition(previous, rows[0]["mask"])
+                rows[0].update(color=color, tension=tension,
+                               freshness=freshness)
+            if rows:
+                previous = rows[-1]["mask"]
+            yield from rows
+
+
+def write_rows(rows, fp, format="csv"):
+    """ 把分析结果逐行写入`fp`。
+
+    Parameters
+    ----------
+    format : str
+        `"csv"`（带表头）或者`"jsonl"`。
+
+    Returns
+    -------
+    int
+        写入的行数。
+    """
+    count = 0
+    if format == "csv":
+        writer = csv.DictWriter(fp, FIELDS, lineterminator="\n")
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    elif format == "jsonl":
+        for row in rows:
+            fp.write(json.dumps(row) + "\n")
+            count += 1
+    else:
+        raise ValueError(f"expected format in ['csv', 'jsonl'], got {format!r}")
+    return count
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", help="和弦序列文件")
+    parser.add_argument("-o", "--output", help="结果文件，默认输出到标准输出")
+    parser.add_argument("-f", "--format", choices=FORMATS,
+                        help="输入格式，默认由扩展名决定")
+    parser.add_argument("--output-format", choices=["csv", "jsonl"],
+                        help="输出格式，默认由输出文件的扩展名决定，否则为 csv")
+    parser.add_argument("-j", "--processes", type=int, default=None,
+                        help="并行分析的进程数")
+    parser.add_argument("--chunk-size", type=int, default=1 << 20,
+                        help="并行分析时每块的字节数")
+    args = parser.parse_args(argv)
+
+    output_format = args.output_format
+    if output_format is None:
+        output_format = "jsonl" if args.output and \
+            guess_format(args.output) == "jsonl" else "csv"
+    rows = analyze_file(args.input, args.format, args.processes,
+                        args.chunk_size)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8", newline="") as f:
+            write_rows(rows, f, output_format)
+    else:
+        write_rows(rows, sys.stdout, output_format)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+""" 移调等价类。
+
+把和弦整体移调（`rotate`）得到的和弦归为同一类，每一类以其中最小的掩码作为
+代表（原型）。4096 个掩码共分为 352 类（包括空集）。
+
+`harmony()`和`interval_vector()`在移调下不变；设`mask == rotate(prime, offset)`，
+则`Chord.from_mask(mask).angle_5(Note(base))`等于
+`Chord.from_mask(prime).angle_5(Note((base - offset) % 12))`。
+因此每一类只需要计算一次特征，原型也可以作为缓存的键。
+"""
+from .note import Note
+from .chord import Chord, FULL_MASK, rotate
+
+
+CLASS_COUNT = 352
+
+
+def _build():
+    canonical = [None] * (FULL_MASK + 1)
+    for mask in range(FULL_MASK + 1):
+        if canonical[mask] is not None:
+            continue
+        # 第一次遇到的掩码就是这一类中最小的
+        for offset in range(12):
+            member = rotate(mask, offset)
+            if canonical[member] is None:
+                canonical[member] = (mask, offset)
+    return canonical
+
+
+# 每个掩码的(原型, 偏移量)
+_CANONICAL = _build()
+_PRIMES = sorted({prime for prime, _ in _CANONICAL})
+
+
+def canonical(mask):
+    """ 掩码`mask`所在的类的原型和偏移量。
+
+    Returns
+    -------
+    prime : int
+        与`mask`移调等价的最小掩码。
+    offset : int
+        满足`rotate(prime, offset) == mask`的最小非负整数。
+    """
+    if isinstance(mask, Chord):
+        mask = mask.mask()
+    if not isinstance(mask, int):
+        raise TypeError(f"expected int or Chord, got {type(mask)}")
+    if not (0 <= mask <= FULL_MASK):
+        raise ValueError(
+            f"expected mask in range(0, {FULL_MASK + 1}), got {mask}"
+        )
+    return _CANONICAL[mask]
+
+
+def period(mask):
+    """ `mask`所在的类的大小，即使移调后与自身相同的最小正偏移量。 """
+    prime, _ = canonical(mask)
+    for offset in range(1, 12):
+        if rotate(prime, offset) == prime:
+            return offset
+    return 12
+
+
+def classes(min_size=0, max_size=12):
+    """ 从小到大列出音符数量在`[min_size, max_size]`内的所有类的原型。 """
+    return [_ for _ in _PRIMES if min_size <= _.bit_count() <= max_size]
+
+
+def members(mask):
+    """ 依次生成`mask`所在的类中的所有掩码，顺序为偏移量从小到大。 """
+    prime, _ = canonical(mask)
+    for offset in range(period(prime)):
+        yield rotate(prime, offset)
+
+
+class ClassFeatures:
+    """ 按移调等价类缓存的和弦特征。
+
+    每一类的特征在第一次用到时由原型计算，同类的其他和弦由原型的特征推出，
+    结果与直接调用`Chord`的方法完全相同。
+    """
+
+    def __init__(self):
+        self.__harmony = {}
+        self.__intervals = {}
+        self.__angle_5 = {}
+
+    def harmony(self, mask):
+        """ 同`Chord.from_mask(mask).harmony()`。 """
+        prime, _ = canonical(mask)
+        if prime not in self.__harmony:
+            self.__harmony[prime] = Chord.from_mask(prime).harmony()
+        return self.__harmony[prime]
+
+    def interval_vector(self, mask):
+        """ 同`Chord.from_mask(mask).interval_vector()`。 """
+        prime, _ = canonical(mask)
+        if prime not in self.__intervals:
+            self.__intervals[prime] = Chord.from_mask(prime).interval_vector()
+        return list(self.__intervals[prime])
+
+    def angle_5(self, mask, base=0):
+        """ 同`Chord.from_mask(mask).angle_5(Note(base))`。 """
+        prime, offset = canonical(mask)
+        if prime not in self.__angle_5:
+            chord = Chord.from_mask(prime)
+            self.__angle_5[prime] = [chord.angle_5(Note(_)) for _ in range(12)]
+        return self.__angle_5[prime][(base - offset) % 12]
+
+    def __len__(self):
+        """ 已经计算过任意一种特征的类的数量。 """
+        return len(self.__harmony.keys() | self.__intervals.keys()
+                   | self.__angle_5.keys())
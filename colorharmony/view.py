@@ -1,21 +1,134 @@
-import matplotlib.pyplot as plt
+import concurrent.futures
+import io
+import os
+
 import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection
+from matplotlib.figure import Figure
 
 from .circle import CIRCLE_5
+from .batch import as_masks, harmony_many, angle_5_many
+
+
+class ChordRenderer:
+    """ 在极坐标中绘制和弦。
+
+    图像和坐标轴只创建一次，每次绘制只更新其中的数据，
+    因此适合在没有显示器的服务器上批量输出图片。
+
+    Parameters
+    ----------
+    figure : matplotlib.figure.Figure, optional
+        在这个图像上绘制。默认新建一个使用 Agg 后端、不依赖`pyplot`的图像。
+    """
+
+    def __init__(self, figure=None, figsize=None, dpi=100):
+        if figure is None:
+            figure = Figure(figsize=figsize, dpi=dpi)
+            FigureCanvasAgg(figure)
+        self.figure = figure
+        self.axes = figure.add_subplot(projection="polar")
+        self.axes.set_xticks(np.arange(0, np.pi*2, np.pi/6),
+                             labels=CIRCLE_5.keys)
+        self.axes.set_yticks(range(0, 7, 1), labels=[])
+        self.__arrows = LineCollection([], colors="gray", linewidths=0.75)
+        self.axes.add_collection(self.__arrows)
+        self.__scatter = self.axes.scatter(np.empty(0), np.empty(0),
+                                           c=np.empty(0), cmap='hsv',
+                                           alpha=0.75)
+
+    def update(self, chords, arrow=False):
+        """ 用`chords`替换图中的和弦。`arrow`为`True`时画出从原点出发的向量。 """
+        masks = as_masks(chords)
+        theta = angle_5_many(masks)
+        r = harmony_many(masks)
+        self.__scatter.set_offsets(np.column_stack([theta, r]))
+        self.__scatter.set_sizes(20 * r ** 2)
+        self.__scatter.set_array(theta)
+        self.__scatter.autoscale()
+        if arrow:
+            self.__arrows.set_segments(
+                [[(t, 0), (t, _)] for t, _ in zip(theta, r)])
+        else:
+            self.__arrows.set_segments([])
+        self.axes.set_ybound(0, 7)
+
+    def render(self, chords, target, arrow=False, format=None):
+        """ 绘制`chords`并保存到`target`。
+
+        Parameters
+        ----------
+        target : str or file-like
+            文件路径或者`io.BytesIO`等可写对象。
+        format : str, optional
+            `"png"`、`"svg"`等。默认由文件扩展名决定，写入对象时为`"png"`。
+        """
+        self.update(chords, arrow)
+        if format is None and not isinstance(target, (str, os.PathLike)):
+            format = "png"
+        self.figure.savefig(target, format=format)
+
+    def render_bytes(self, chords, arrow=False, format="png"):
+        """ 绘制`chords`并返回图片的内容。 """
+        buffer = io.BytesIO()
+        self.render(chords, buffer, arrow, format)
+        return buffer.getvalue()
+
+
+# 进程池中每个进程各自的绘图器
+_worker_renderer = None
+
+
+def _render_worker(masks, path, arrow, format):
+    global _worker_renderer
+    if _worker_renderer is None:
+        _worker_renderer = ChordRenderer()
+    _worker_renderer.render(masks, path, arrow, format)
+    return path
+
+
+def render_many(chord_sets, directory, arrow=False, format="png",
+                processes=None):
+    """ 把每组和弦分别绘制到`directory`中的一张图片。
+
+    第`i`组和弦保存为`{i:06d}.{format}`。
+
+    Parameters
+    ----------
+    chord_sets : iterable
+        每一项都可以传给`ChordRenderer.update`。
+    processes : int, optional
+        大于 1 时使用这么多个进程并行绘制。
+
+    Returns
+    -------
+    list of str
+        按顺序排列的图片路径。
+    """
+    os.makedirs(directory, exist_ok=True)
+    jobs = [
+        (as_masks(chords), os.path.join(directory, f"{i:06d}.{format}"))
+        for i, chords in enumerate(chord_sets)
+    ]
+    if processes is None or processes <= 1:
+        renderer = ChordRenderer()
+        for masks, path in jobs:
+            renderer.render(masks, path, arrow, format)
+        return [path for _, path in jobs]
+
+    with concurrent.futures.ProcessPoolExecutor(processes) as executor:
+        futures = [
+            executor.submit(_render_worker, masks, path, arrow, format)
+            for masks, path in jobs
+        ]
+        return [_.result() for _ in futures]
 
 
 def show_chords(chords, arrow=False, img_path=None):
-    fig, ax = plt.subplots(subplot_kw={"polar": True})
-    theta = np.asarray([_.angle_5() for _ in chords])
-    r = np.asarray([_.harmony() for _ in chords])
-    area = 20 * r ** 2
-    colors = theta
-    ax.scatter(theta, r, c=colors, s=area, cmap='hsv', alpha=0.75)
-    ax.set_xticks(np.arange(0, np.pi*2, np.pi/6), labels=CIRCLE_5.keys)
-    ax.set_ybound(0, 7)
-    ax.set_yticks(range(0, 7, 1), labels=[])
     if img_path:
-        # TODO
-        pass
+        ChordRenderer().render(chords, img_path, arrow)
     else:
+        import matplotlib.pyplot as plt
+        ChordRenderer(figure=plt.figure()).update(chords, arrow)
         plt.show()
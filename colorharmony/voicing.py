@@ -0,0 +1,208 @@
+""" 带八度的和弦排列（voicing）和声部进行的距离。
+
+`Note`不区分八度，`Voicing`则以 MIDI 音高（0~127，60 为中央 C）保存每个声部，
+可以衡量从一个和弦进行到下一个和弦时各声部移动的距离。
+"""
+import numpy as np
+
+from .chord import Chord
+from .batch import as_masks, bits
+
+
+MIDI_RANGE = range(128)
+
+
+class Voicing:
+    """ 一组 MIDI 音高，按从低到高的顺序保存，允许重复。
+
+    Parameters
+    ----------
+    pitches : iterable of int
+        每个声部的 MIDI 音高。
+
+    Attributes
+    ----------
+    __pitches : numpy.ndarray
+        只读的`int16`数组。
+    """
+
+    __slots__ = ("__pitches",)
+
+    def __init__(self, pitches):
+        pitches = np.asarray(list(pitches))
+        if pitches.size and not np.issubdtype(pitches.dtype, np.integer):
+            raise TypeError(f"expected int pitches, got {pitches.dtype}")
+        if pitches.size == 0:
+            raise ValueError("expected at least 1 pitch, got 0")
+        if pitches.min() < MIDI_RANGE.start or pitches.max() >= MIDI_RANGE.stop:
+            raise ValueError(f"expected pitches in {MIDI_RANGE}, "
+                             f"got {pitches.tolist()}")
+        pitches = np.sort(pitches).astype(np.int16)
+        pitches.flags.writeable = False
+        self.__pitches = pitches
+
+    @classmethod
+    def from_chord(cls, chord, octave=4):
+        """ 把`chord`的音符按密集排列放在第`octave`个八度（C4 为 60）。 """
+        if not isinstance(chord, Chord):
+            raise TypeError(f"expected Chord, got {type(chord)}")
+        return cls(12 * (octave + 1) + _ for _ in chord)
+
+    def pitches(self):
+        return self.__pitches
+
+    def chord(self):
+        """ 去掉八度后的`Chord`，至少需要 2 个不同的音符。 """
+        return Chord((self.__pitches % 12).tolist())
+
+    def transpose(self, step):
+        """ 所有声部移动`step`个半音。 """
+        return Voicing((self.__pitches + step).tolist())
+
+    def distance(self, other):
+        """ 到`other`的声部进行距离，见`voice_leading_many`。 """
+        if not isinstance(other, Voicing):
+            raise TypeError(f"expected Voicing, got {type(other)}")
+        return int(voice_leading_many(self, [other])[0])
+
+    def __len__(self):
+        return len(self.__pitches)
+
+    def __iter__(self):
+        return iter(self.__pitches.tolist())
+
+    def __eq__(self, other):
+        if not isinstance(other, Voicing):
+            return NotImplemented
+        return np.array_equal(self.__pitches, other.__pitches)
+
+    def __hash__(self):
+        return hash(self.__pitches.tobytes())
+
+    def __reduce__(self):
+        return Voicing, (self.__pitches.tolist(),)
+
+    def __str__(self):
+        return f"({', '.join(map(str, self))})"
+
+    def __repr__(self):
+        return f"<Voicing {str(self)}>"
+
+
+def _pitch_array(voicings):
+    """ 一组声部数相同的排列转换为形状为`(n, k)`的数组。 """
+    if isinstance(voicings, np.ndarray):
+        array = voicings
+    else:
+        array = [_.pitches() if isinstance(_, Voicing) else list(_)
+                 for _ in voicings]
+        if len({len(_) for _ in array}) > 1:
+            raise ValueError("expected voicings with the same number of voices")
+        array = np.asarray(array)
+    if array.ndim != 2:
+        raise ValueError(f"expected 2 dimensions, got {array.ndim}")
+    return array.astype(np.int64)
+
+
+def voice_leading_many(source, candidates):
+    """ 从`source`到每个候选排列的最小声部移动距离。
+
+    距离为在两个排列的声部之间一一对应时，所有声部移动的半音数之和的最小值。
+    直线上按从低到高的顺序对应总是最优的，因此只需要排序后逐项相减。
+
+    Parameters
+    ----------
+    source : Voicing
+    candidates : array_like
+        `Voicing`的序列，或者形状为`(n, len(source))`的音高数组。
+
+    Returns
+    -------
+    numpy.ndarray
+        长度为`n`的整数数组。
+    """
+    if not isinstance(source, Voicing):
+        source = Voicing(source)
+    array = _pitch_array(candidates)
+    if array.shape[1] != len(source):
+        raise ValueError(f"expected {len(source)} voices, "
+                         f"got {array.shape[1]}")
+    return np.abs(np.sort(array, axis=1) - source.pitches()).sum(axis=1)
+
+
+def nearest_voicings(source, chords):
+    """ 对每个和弦，求出声部数与`source`相同、声部移动距离最小的排列。
+
+    每个声部移到和弦中的一个不同的音符上，八度任选；音符数量与`source`的声部数
+    不同的和弦无法这样排列。最优的对应保持声部在音级圆上的循环顺序，
+    因此只需要比较`len(source)`种旋转，所有和弦一起用 NumPy 计算。
+
+    Parameters
+    ----------
+    source : Voicing
+    chords : array_like
+        可以传给`batch.as_masks`的和弦。
+
+    Returns
+    -------
+    pitches : numpy.ndarray
+        形状为`(n, len(source))`的音高数组，每行从低到高排列；
+        无法排列的和弦为 -1。距离相同时声部向上移动。
+    distances : numpy.ndarray
+        长度为`n`的数组，同`voice_leading_many`；无法排列的和弦为`inf`。
+    """
+    if not isinstance(source, Voicing):
+        source = Voicing(source)
+    masks = as_masks(chords)
+    k = len(source)
+    pitches = np.full((len(masks), k), -1, dtype=np.int64)
+    distances = np.full(len(masks), np.inf)
+
+    b = bits(masks)
+    rows = np.flatnonzero(b.sum(axis=1) == k)
+    if len(rows) == 0:
+        return pitches, distances
+    # 每行为和弦中的音级，从小到大
+    targets = np.nonzero(b[rows])[1].reshape(len(rows), k)
+    # 声部按音级排序后，与和弦的音级按循环顺序对应
+    voices = source.pitches().astype(np.int64)
+    voices = voices[np.argsort(voices % 12, kind="stable")]
+
+    best_moves = None
+    best_cost = None
+    for shift in range(k):
+        moves = (np.roll(targets, -shift, axis=1) - voices) % 12
+        moves = np.where(moves > 6, moves - 12, moves)
+        cost = np.abs(moves).sum(axis=1)
+        if best_cost is None:
+            best_moves, best_cost = moves, cost
+        else:
+            better = cost < best_cost
+            best_moves = np.where(better[:, None], moves, best_moves)
+            best_cost = np.where(better, cost, best_cost)
+
+    result = np.sort(voices + best_moves, axis=1)
+    # 超出 MIDI 范围时移动一个八度
+    result = np.where(result < MIDI_RANGE.start, result + 12, result)
+    result = np.where(result >= MIDI_RANGE.stop, result - 12, result)
+    result = np.sort(result, axis=1)
+    pitches[rows] = result
+    distances[rows] = np.abs(result - source.pitches()).sum(axis=1)
+    return pitches, distances
+
+
+def rank_chords(source, chords):
+    """ 按`nearest_voicings`的距离从小到大排列`chords`。
+
+    可以用来对`Container.nearest`给出的候选和弦按声部进行的平滑程度排序。
+    距离相同时保持原来的顺序，无法排列的和弦被排除。
+
+    Returns
+    -------
+    list of (Chord, Voicing)
+    """
+    chords = [_ if isinstance(_, Chord) else Chord(_) for _ in chords]
+    pitches, distances = nearest_voicings(source, chords)
+    order = np.argsort(distances, kind="stable")
+    return [(chords[i], Voicing(pitches[i].tolist()))
+            for i in order if np.isfinite(distances[i])]
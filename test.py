@@ -1,8 +1,122 @@
 import unittest
+import asyncio
+import copy
 import itertools
+import json
+import pickle
+import subprocess
+import sys
 
-from colorharmony import Circle, Note, Chord, Container
+import os
+import tempfile
+import time
+
+import numpy
+
+import colorChord
+
+from colorharmony import Circle, Note, Chord, Container, ColumnarContainer
+from colorharmony import harmony_many, angle_5_many, show_chords
+from colorharmony import count_1_many, count_5_many, transition_many
+from colorharmony import instrument, stream, transposition
+from colorharmony import ProgressionGenerator, ProgressionPlanner
 from colorharmony.circle import CIRCLE_1, CIRCLE_5
+from colorharmony.chord import FULL_MASK, rotate
+from colorharmony.container import cartesian
+from colorharmony.batch import as_masks, bits, from_bits
+from colorharmony.kdtree import KDTree
+from colorharmony.parallel import map_chunks
+from colorharmony.voicing import Voicing, voice_leading_many
+from colorharmony.voicing import nearest_voicings, rank_chords
+from colorharmony.storage import CONTAINER_HEADER, CONTAINER_MAGIC
+from colorharmony.storage import CONTAINER_VERSION, save_columns
+from colorharmony.server import InferenceServer, InferenceClient
+from colorharmony.atlas import build_atlas, load_atlas, use_atlas, legacy_chord
+
+
+def original_get_harmony(self):
+    '''
+    colorChord.Chord.get_harmony 最初的实现（原样复制），用于检查查表的结果
+    :return:
+    '''
+    harmony = 1.77777
+    perfect5 = self.pure_fifth_span()
+    Major2 = self.get_Major2nd()
+    Minor2 = self.get_semitones()
+    Major = self.if_Major_Chord_exist()
+    Minor = self.if_Minor_Chord_exist()
+    if perfect5>=2 and perfect5<=4 and Minor2==0:
+        if Major2<=1:
+            if(Major or Minor):
+                harmony = 10
+            else:
+                harmony = 9.67
+        if Major2>=2 and Major2<=3:
+            harmony = 9.33
+    elif perfect5 == 5 and Minor2 == 1:
+        if Major2<=1 and (Major or Minor):
+            harmony = 7
+        elif Major2==2 and (Major or Minor):
+            harmony = 6.67
+        elif Major2>2 or not(Major or Minor):
+            harmony = 6.33
+    elif perfect5 == 6:
+        if Minor2 == 0:
+            if Major2<=1:
+                if(Major or Minor):
+                    harmony = 9
+                else:
+                    harmony = 8.67
+            elif Major2==3:
+                harmony = 8.33
+        elif Minor2 == 1:
+            if Major2 == 1 and (Major or Minor):
+                harmony = 6
+            elif Major2 ==2 and(Major or Minor):
+                harmony = 5.67
+            elif Major2>=2 or not(Major or Minor):
+                harmony = 5.33
+        elif Minor2 == 2:
+            if Major2==1 and(Major or Minor):
+                harmony = 4
+            elif Major2>=1 or not(Major or Minor):
+                harmony = 3.5
+    elif perfect5>=7 and perfect5 <=11:
+        if(Minor2==0):
+            if perfect5 == 8 and Major2 == 0:
+                harmony=8
+            elif perfect5 == 8 and Major2 == 2:
+                harmony = 7.67
+            elif Major2>=2 or perfect5>8:
+                harmony = 7.33
+        elif(Minor2 == 1):
+            if Major2==0 and (Major or Minor):
+                harmony = 5
+            elif Major2<=2 and (Major or Minor):
+                harmony = 4.67
+            elif Major2 >2 or not(Major or Minor):
+                harmony =4.33
+        elif(Minor2 == 2):
+            if Major2<=2 and (Major or Minor):
+                harmony = 3
+            elif Major2>=2 or not(Major or Minor):
+                harmony = 2.75
+            elif Major2<=3 and (Major or Minor):
+                harmony = 2.5
+            elif Major2>3 or not(Major or Minor):
+                harmony =2.25
+        elif(Minor2==3):
+            pass#TODO
+        elif(Minor2>=4):
+            pass
+    else:
+        pass
+    return harmony
+
+
+def failing_harmony(masks):
+    """ 在子进程中引发异常，用于检查`map_chunks`的异常处理。 """
+    raise ZeroDivisionError(f"failed on {len(masks)} masks")
 
 
 class TestNote(unittest.TestCase):
@@ -114,6 +228,19 @@ class TestNote(unittest.TestCase):
         with self.assertRaises(ValueError):
             Note("C").next_5(13)
 
+    def test_interning(self):
+        for v in range(12):
+            self.assertIs(Note(v), Note(CIRCLE_1.keys[v]))
+            self.assertIs(Note(v), Note(Note(v)))
+            self.assertIs(Note(v), copy.deepcopy(Note(v)))
+            self.assertIs(Note(v), pickle.loads(pickle.dumps(Note(v))))
+        self.assertIs(Note("C").next_5(1), Note("F"))
+
+        with self.assertRaises(AttributeError):
+            Note("C")._Note__value = 1
+        with self.assertRaises(AttributeError):
+            Note("C").octave = 4
+
     # TODO: test to_musicpy_note
 
 
@@ -127,6 +254,11 @@ class TestCircle(unittest.TestCase):
         self.assertEqual(self.circle.keys, list(self.value2str.values()))
         self.assertEqual(self.circle.available_keys, list(self.str2value.keys()))
 
+    def test_contains(self):
+        for s in self.str2value:
+            self.assertIn(s, self.circle)
+        self.assertNotIn("H", self.circle)
+
     def test_value2str(self):
         for i, s in self.value2str.items():
             self.assertEqual(self.circle.value2str(i), s)
@@ -223,6 +355,26 @@ class TestChord(unittest.TestCase):
         with self.assertRaises(ValueError):
             chord.count_1([9, 10, 11, 12, 13])
 
+    def test_count_5(self):
+        chord = Chord(range(12))
+        for interval in range(1, 12):
+            self.assertEqual(chord.count_5(interval), 12)
+
+        chord = Chord([0, 2, 4, 5, 7, 9, 11])
+        for interval in range(12):
+            self.assertEqual(chord.count_5(interval),
+                             chord.count_1(interval * 5 % 12))
+        self.assertEqual(chord.count_5([0, 1, 2, 3, 4, 5, 6]), 1)
+        self.assertEqual(chord.count_5([0, 1, 2, 3, 4, 5, 6, 7]), 0)
+        self.assertEqual(chord.count_5([0, 1, 2]), 5)
+        self.assertEqual(chord.count_5(Chord([0, 4, 7])),
+                         chord.count_1([0, 4, 7]))
+        self.assertEqual(chord.count_5(["C", "E", "G"]),
+                         chord.count_1([0, 4, 7]))
+
+        with self.assertRaises(ValueError):
+            chord.count_5([9, 10, 11, 12, 13])
+
     def test_harmony(self):
         cases = [
             [[0, 4, 7], 16 / 3],
@@ -234,6 +386,372 @@ class TestChord(unittest.TestCase):
         for v, h in cases:
             self.assertEqual(Chord(v).harmony(), h)
 
+    def test_mask(self):
+        self.assertEqual(Chord([0, 4, 7]).mask(), 0b10010001)
+        self.assertEqual(Chord.from_mask(0b10010001), Chord([0, 4, 7]))
+        self.assertEqual(hash(Chord.from_mask(0b10010001)),
+                         hash(Chord([7, 4, 0])))
+
+        with self.assertRaises(ValueError):
+            Chord.from_mask(0b1000)
+        with self.assertRaises(ValueError):
+            Chord.from_mask(1 << 12)
+        with self.assertRaises(TypeError):
+            Chord.from_mask("C E G")
+
+    def test_next(self):
+        chord = Chord([0, 4, 7])
+        for step in range(12):
+            self.assertEqual(
+                chord.next_1(step),
+                Chord([_.next_1(step) for _ in chord.notes()])
+            )
+            self.assertEqual(
+                chord.next_5(step),
+                Chord([_.next_5(step) for _ in chord.notes()])
+            )
+
+        with self.assertRaises(ValueError):
+            chord.next_1(12)
+
+    def test_issubset(self):
+        self.assertTrue(Chord([0, 4]).issubset(Chord([0, 4, 7])))
+        self.assertFalse(Chord([0, 3]).issubset(Chord([0, 4, 7])))
+        self.assertTrue(Chord([0, 4, 7]).issuperset(Chord([4, 7])))
+        self.assertIn(Note("E"), Chord([0, 4, 7]))
+        self.assertNotIn(Note("D"), Chord([0, 4, 7]))
+
+
+class TestBatch(unittest.TestCase):
+
+    masks = [m for m in range(1 << 12) if m.bit_count() >= 2]
+
+    def test_harmony_many(self):
+        harmony = harmony_many(self.masks)
+        for m, h in zip(self.masks, harmony):
+            self.assertEqual(Chord.from_mask(m).harmony(), h)
+
+        chords = [Chord([0, 4, 7]), Chord([0, 1, 4, 7])]
+        self.assertEqual(list(harmony_many(chords)), [16 / 3, 20 / 6])
+        self.assertEqual(list(harmony_many([[0, 4, 7], [0, 1, 4, 7]])),
+                         [16 / 3, 20 / 6])
+
+        with self.assertRaises(ValueError):
+            harmony_many([0b1000])
+
+    def test_as_masks(self):
+        c_major = Chord([0, 4, 7]).mask()
+        rows = [[0, 2, 4, 5, 7, 9, 11, 1, 3, 6, 8, 10],
+                [0, 4, 7, 0, 4, 7, 0, 4, 7, 0, 4, 7]]
+        self.assertEqual(as_masks(numpy.array(rows)).tolist(),
+                         [FULL_MASK, c_major])
+        self.assertEqual(as_masks(numpy.array(rows)).tolist(),
+                         as_masks(rows).tolist())
+        self.assertEqual(as_masks(numpy.array([[0, 4, 7], [2, 5, 9]])).tolist(),
+                         [c_major, Chord([2, 5, 9]).mask()])
+        self.assertEqual(as_masks(list(numpy.array([[0, 4, 7]]))).tolist(),
+                         [c_major])
+        with self.assertRaises(ValueError):
+            as_masks(numpy.array([[0, 4, 12]]))
+        with self.assertRaises(ValueError):
+            as_masks(numpy.array([[4, 4, 4]]))
+
+        columnar = ColumnarContainer(notes=[0, 2, 4, 5])
+        self.assertEqual(as_masks(list(columnar.masks())).tolist(),
+                         columnar.masks().tolist())
+        self.assertEqual(as_masks([numpy.uint16(c_major), c_major]).tolist(),
+                         [c_major, c_major])
+
+        indicator = [[1, 0, 0, 0, 1, 0, 0, 1, 0, 0, 0, 0]]
+        self.assertEqual(from_bits(indicator).tolist(), [c_major])
+        self.assertEqual(from_bits(bits([c_major, 0b11])).tolist(),
+                         [c_major, 0b11])
+        with self.assertRaises(ValueError):
+            from_bits([[1, 0, 1]])
+
+    def test_count_many(self):
+        patterns = [1, 6, [0, 4, 7], [0, 1, 2], Chord([0, 4, 7, 10])]
+        for pattern in patterns:
+            counts_1 = count_1_many(self.masks, pattern)
+            counts_5 = count_5_many(self.masks, pattern)
+            for m, c1, c5 in zip(self.masks, counts_1, counts_5):
+                self.assertEqual(Chord.from_mask(m).count_1(pattern), c1)
+                self.assertEqual(Chord.from_mask(m).count_5(pattern), c5)
+        self.assertEqual(list(count_1_many(self.masks[:3], 0)), [0, 0, 0])
+
+    def test_angle_5_many(self):
+        for base in CIRCLE_1.keys:
+            angle = angle_5_many(self.masks, Note(base))
+            for m, a in zip(self.masks, angle):
+                self.assertEqual(Chord.from_mask(m).angle_5(Note(base)), a)
+
+    def test_transition_many(self):
+        masks1 = self.masks[::7]
+        masks2 = self.masks[::-7]
+        result = transition_many(masks1, masks2)
+        self.assertEqual(result.shape, (len(masks1), 3))
+        for (m1, m2), row in zip(zip(masks1, masks2), result):
+            c1, c2 = legacy_chord(m1), legacy_chord(m2)
+            c1.get_theta()
+            c2.get_theta()
+            self.assertEqual(
+                row.tolist(),
+                [colorChord.Chord.get_color_change色彩变化(c1, c2),
+                 colorChord.Chord.get_tension_change紧张度变化(c1, c2),
+                 colorChord.Chord.get_fressness新鲜度(c1, c2)],
+            )
+        with self.assertRaises(ValueError):
+            transition_many(masks1, masks2[1:])
+
+    def test_processes(self):
+        numpy.testing.assert_array_equal(
+            harmony_many(self.masks, processes=2), harmony_many(self.masks))
+        numpy.testing.assert_array_equal(
+            angle_5_many(self.masks, Note("A"), processes=3),
+            angle_5_many(self.masks, Note("A")),
+        )
+        masks1 = self.masks[::5]
+        masks2 = self.masks[::-5]
+        numpy.testing.assert_array_equal(
+            transition_many(masks1, masks2, processes=2),
+            transition_many(masks1, masks2),
+        )
+        self.assertEqual(harmony_many([], processes=2).shape, (0,))
+
+    def test_processes_error(self):
+        masks = numpy.array(self.masks)
+        with self.assertRaisesRegex(ZeroDivisionError, "failed on"):
+            map_chunks(failing_harmony, [masks], masks.shape, processes=2)
+
+
+class TestAtlas(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.path = build_atlas(os.path.join(cls.tmpdir.name, "atlas.bin"))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def tearDown(self):
+        use_atlas(None)
+        colorChord.use_atlas(None)
+
+    def test_load(self):
+        for mmap in [True, False]:
+            atlas = load_atlas(self.path, mmap=mmap)
+            for m in range(3, 1 << 12, 7):
+                if m.bit_count() < 2:
+                    continue
+                chord = Chord.from_mask(m)
+                self.assertEqual(atlas.harmony(m), chord.harmony())
+                self.assertEqual(atlas.angle_5(m, 3), chord.angle_5(Note(3)))
+                self.assertEqual(atlas.interval_vector(m),
+                                 chord.interval_vector())
+                legacy = legacy_chord(m)
+                self.assertEqual(atlas.legacy_harmony(m),
+                                 legacy.get_harmony())
+                self.assertEqual(atlas.legacy_theta(m), legacy.get_theta())
+
+        with open(self.path, "rb") as f:
+            data = bytearray(f.read())
+        data[8] += 1
+        path = os.path.join(self.tmpdir.name, "bad.bin")
+        with open(path, "wb") as f:
+            f.write(data)
+        with self.assertRaises(ValueError):
+            load_atlas(path)
+
+    def test_use_atlas(self):
+        chord = Chord([0, 4, 7])
+        expected = chord.harmony(), chord.angle_5(Note("D"))
+        use_atlas(load_atlas(self.path))
+        self.assertEqual((chord.harmony(), chord.angle_5(Note("D"))),
+                         expected)
+        self.assertEqual(list(harmony_many([chord])), [expected[0]])
+
+        legacy = colorChord.Chord.init_by_note_name_str(["C", "E", "G"])
+        expected = legacy.get_harmony(), legacy.get_theta()
+        colorChord.use_atlas(load_atlas(self.path))
+        self.assertEqual((legacy.get_harmony(), legacy.get_theta()),
+                         expected)
+        self.assertIs(type(legacy.get_harmony()), int)
+        for mask in range(1, 1 << 12):
+            legacy = legacy_chord(mask)
+            expected = original_get_harmony(legacy)
+            self.assertEqual(legacy.get_harmony(), expected)
+            self.assertIs(type(legacy.get_harmony()), type(expected))
+
+    def test_use_atlas_lookup(self):
+        # 修改特征表中的一行，确认结果确实来自特征表
+        atlas = load_atlas(self.path, mmap=False)
+        mask = Chord([0, 4, 7]).mask()
+        row = atlas.table[mask:mask + 1]
+        row["harmony"] = 100.0
+        row["angle_5"][0, 2] = 50.0
+        row["legacy_harmony"] = 7.5
+        row["legacy_theta"][0, :2] = [123.0, 45.0]
+        row["legacy_theta_count"] = 2
+
+        use_atlas(atlas)
+        chord = Chord([0, 4, 7])
+        self.assertEqual(chord.harmony(), 100.0)
+        self.assertEqual(chord.angle_5(Note("D")), 50.0)
+        self.assertEqual(list(harmony_many([chord, Chord([0, 4])])),
+                         [100.0, Chord([0, 4]).harmony()])
+
+        colorChord.use_atlas(atlas)
+        legacy = colorChord.Chord.init_by_note_name_str(["C", "E", "G"])
+        self.assertEqual(legacy.get_harmony(), 7.5)
+        self.assertEqual(legacy.get_theta(), [123.0, 45.0])
+
+        use_atlas(None)
+        colorChord.use_atlas(None)
+        self.assertNotEqual(Chord([0, 4, 7]).harmony(), 100.0)
+        self.assertNotEqual(legacy.get_harmony(), 7.5)
+
+
+class TestKDTree(unittest.TestCase):
+
+    def test_insert_remove(self):
+        rng = numpy.random.default_rng(0)
+        points = rng.integers(0, 8, size=(300, 2)).tolist()
+        tree = KDTree([(x, y, i) for i, (x, y) in enumerate(points[:100])])
+        alive = set(range(100))
+        for i in range(100, 300):
+            tree.insert(*points[i], i)
+            alive.add(i)
+            if i % 2:
+                removed = int(rng.choice(sorted(alive)))
+                tree.remove(removed)
+                alive.remove(removed)
+            expected = sorted(
+                alive,
+                key=lambda j: ((points[j][0] - 3) ** 2
+                               + (points[j][1] - 4) ** 2, j),
+            )
+            self.assertEqual(tree.query(3, 4, 20), expected[:20])
+        self.assertEqual(len(tree), len(alive))
+        with self.assertRaises(KeyError):
+            tree.remove(-1)
+        with self.assertRaises(ValueError):
+            tree.insert(0, 0, None, key=min(alive))
+
+    def test_degenerate(self):
+        # 单调插入的点在重建之前连成一条比递归深度限制更长的链
+        rng = numpy.random.default_rng(1)
+        points = rng.random((2000, 2)).tolist()
+        tree = KDTree([(x, y, i) for i, (x, y) in enumerate(points)])
+        for i in range(1010):
+            points.append([1 + i, 1 + i])
+            tree.insert(1 + i, 1 + i, len(points) - 1)
+        for x, y in [(1010, 1010), (0.5, 0.5), (500.2, 499.7)]:
+            expected = sorted(
+                range(len(points)),
+                key=lambda j: ((points[j][0] - x) ** 2
+                               + (points[j][1] - y) ** 2, j),
+            )
+            self.assertEqual(tree.query(x, y, 10), expected[:10])
+
+
+class TestTransposition(unittest.TestCase):
+
+    def test_canonical(self):
+        self.assertEqual(len(transposition.classes()), transposition.CLASS_COUNT)
+        self.assertEqual(len(transposition.classes(3, 3)), 19)
+        self.assertEqual(transposition.classes(0, 1), [0, 1])
+        for mask in range(1 << 12):
+            prime, offset = transposition.canonical(mask)
+            self.assertEqual(rotate(prime, offset), mask)
+            self.assertIn(prime, transposition.classes())
+            self.assertLessEqual(prime, mask)
+        self.assertEqual(transposition.canonical(Chord([2, 6, 9])), (0b10010001, 2))
+        self.assertRaises(ValueError, transposition.canonical, 1 << 12)
+        self.assertRaises(TypeError, transposition.canonical, "C")
+
+    def test_members(self):
+        self.assertEqual(
+            sum(len(list(transposition.members(_)))
+                for _ in transposition.classes()),
+            1 << 12,
+        )
+        self.assertEqual(list(transposition.members(Chord([0, 4, 8]))),
+                         [0b000100010001, 0b001000100010,
+                          0b010001000100, 0b100010001000])
+        self.assertEqual(transposition.period(0b000001000001), 6)
+        self.assertEqual(transposition.period(0b10010001), 12)
+
+    def test_features(self):
+        features = transposition.ClassFeatures()
+        for mask in range(1 << 12):
+            if mask.bit_count() < 2:
+                continue
+            chord = Chord.from_mask(mask)
+            self.assertEqual(features.harmony(mask), chord.harmony())
+            self.assertEqual(features.interval_vector(mask),
+                             chord.interval_vector())
+            for base in range(12):
+                self.assertEqual(features.angle_5(mask, base),
+                                 chord.angle_5(Note(base)))
+        self.assertEqual(len(features), transposition.CLASS_COUNT - 2)
+
+
+class TestVoicing(unittest.TestCase):
+
+    def test_voicing(self):
+        voicing = Voicing([67, 60, 64, 72])
+        self.assertEqual(list(voicing), [60, 64, 67, 72])
+        self.assertEqual(len(voicing), 4)
+        self.assertEqual(voicing.chord(), Chord([0, 4, 7]))
+        self.assertEqual(voicing.transpose(2).chord(), Chord([2, 6, 9]))
+        self.assertEqual(Voicing.from_chord(Chord([0, 4, 7]), 3),
+                         Voicing([48, 52, 55]))
+        self.assertEqual(hash(voicing), hash(Voicing([60, 64, 67, 72])))
+        self.assertEqual(pickle.loads(pickle.dumps(voicing)), voicing)
+        self.assertFalse(voicing.pitches().flags.writeable)
+        self.assertRaises(ValueError, Voicing, [])
+        self.assertRaises(ValueError, Voicing, [60, 128])
+        self.assertRaises(TypeError, Voicing, [60.5])
+
+    def test_voice_leading_many(self):
+        source = Voicing([60, 64, 67])
+        self.assertEqual(source.distance(Voicing([59, 65, 67])), 2)
+        self.assertEqual(
+            voice_leading_many(source, [[67, 59, 65], [60, 64, 67],
+                                        [48, 52, 55]]).tolist(),
+            [2, 0, 36],
+        )
+        self.assertRaises(ValueError, voice_leading_many, source, [[60, 64]])
+
+    def test_nearest_voicings(self):
+        def brute(source, mask):
+            values = Chord.from_mask(mask).values()
+            if len(values) != len(source):
+                return numpy.inf
+            return min(
+                sum(min((t - s) % 12, (s - t) % 12) for s, t in zip(source, p))
+                for p in itertools.permutations(values)
+            )
+
+        masks = [m for m in range(1 << 12) if 2 <= m.bit_count() <= 5]
+        for source in [[60, 64, 67], [43, 59, 62, 65], [48, 60, 64, 79, 70]]:
+            pitches, distances = nearest_voicings(Voicing(source), masks[::7])
+            for mask, row, d in zip(masks[::7], pitches, distances):
+                self.assertEqual(d, brute(source, mask))
+                if numpy.isfinite(d):
+                    self.assertEqual(Voicing(row.tolist()).chord().mask(), mask)
+                    self.assertEqual(
+                        voice_leading_many(Voicing(source), [row])[0], d)
+
+        ranked = rank_chords(Voicing([60, 64, 67]),
+                             [Chord([0, 2]), Chord([2, 5, 9]), Chord([0, 4, 7]),
+                              Chord([11, 2, 7])])
+        self.assertEqual([_[0] for _ in ranked],
+                         [Chord([0, 4, 7]), Chord([11, 2, 7]), Chord([2, 5, 9])])
+        self.assertEqual(ranked[1][1], Voicing([59, 62, 67]))
+
 
 class TestContainer(unittest.TestCase):
 
@@ -291,9 +809,739 @@ class TestContainer(unittest.TestCase):
             }
         )
 
+    def test_nearest(self):
+        container = Container(notes=range(12))
+        chords = sorted(container.chords(), key=lambda x: x.mask())
+        for chord in [Chord([0, 4, 7]), Chord([1, 2, 6, 9, 11])]:
+            x1, y1 = cartesian(chord)
+            expected = sorted(
+                chords,
+                key=lambda x: (x1 - cartesian(x)[0]) ** 2
+                            + (y1 - cartesian(x)[1]) ** 2,
+            )
+            for k in [0, 1, 7, 205, len(chords)]:
+                self.assertEqual(container.nearest(chord, k), expected[:k])
+
+        container.remove(Chord([0, 4, 7]))
+        self.assertNotIn(Chord([0, 4, 7]),
+                         container.nearest(Chord([0, 4, 7]), 10))
+
+    def test_chords(self):
+        container = Container(notes=[0, 4, 7])
+        chords = container.chords()
+        self.assertIsInstance(chords, set)
+        self.assertEqual(chords | {Chord([0, 1])}, {
+            Chord([0, 4]), Chord([0, 7]), Chord([4, 7]), Chord([0, 4, 7]),
+            Chord([0, 1]),
+        })
+        self.assertEqual(chords - {Chord([0, 4])},
+                         {Chord([0, 7]), Chord([4, 7]), Chord([0, 4, 7])})
+        for chord in container.chords():
+            container.remove(chord)
+        self.assertEqual(len(container), 0)
+        self.assertEqual(len(chords), 4)
+
+        lazy = Container(notes=[0, 4, 7], lazy=True)
+        view = lazy.chords()
+        self.assertEqual(view, chords)
+        self.assertIsInstance(view | {Chord([0, 1])}, set)
+        self.assertIsInstance(view - {Chord([0, 4])}, set)
+        self.assertEqual(view & {Chord([0, 4]), Chord([0, 1])}, {Chord([0, 4])})
+        copied = view.copy()
+        self.assertIsInstance(copied, set)
+        lazy.remove(Chord([0, 4]))
+        self.assertNotIn(Chord([0, 4]), view)
+        self.assertIn(Chord([0, 4]), copied)
+
+    def test_query(self):
+        container = Container(notes=range(12))
+
+        def expected(harmony, angle_5):
+            def selected(chord):
+                if not harmony[0] <= chord.harmony() <= harmony[1]:
+                    return False
+                start, stop = angle_5
+                angle = chord.angle_5()
+                if start <= stop:
+                    return start <= angle <= stop
+                return angle >= start or angle <= stop
+            return sorted(_.mask() for _ in container if selected(_))
+
+        for harmony, angle_5 in [((4, 6), (0, 12)), ((0, 8), (5, 7)),
+                                 ((4, 6), (11, 1)), ((3.3, 3.4), (10, 2)),
+                                 ((6, 4), (0, 12))]:
+            self.assertEqual(container.query(harmony, angle_5, masks=True),
+                             expected(harmony, angle_5))
+        self.assertEqual(container.query(harmony=(4, 6)),
+                         container.query((4, 6), (0, 12)))
+        self.assertEqual(container.query(angle_5=(-1, 1), masks=True),
+                         expected((0, 8), (11, 1)))
+        self.assertEqual(container.query(masks=True), container.masks())
+        self.assertEqual(container.query(angle_5=(3, 15), masks=True),
+                         container.masks())
+
+        container.remove(Chord([0, 4, 7]))
+        self.assertNotIn(Chord([0, 4, 7]), container.query((5, 6)))
+        container.add(Chord([0, 4, 7]))
+        self.assertIn(Chord([0, 4, 7]), container.query((5, 6)))
+
+    def test_save_load(self):
+        container = Container(notes=range(12), seed=1)
+        chord = Chord([0, 4, 7])
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "chords.bin")
+            container.save(path)
+
+            loaded = Container.load(path, mmap=False, seed=1)
+            self.assertIsInstance(loaded, Container)
+            self.assertEqual(loaded.masks(), container.masks())
+            self.assertEqual(loaded.nearest(chord, 20),
+                             container.nearest(chord, 20))
+            self.assertEqual(loaded.infer_many([chord] * 10),
+                             Container(notes=range(12), seed=1)
+                             .infer_many([chord] * 10))
+
+            mapped = Container.load(path, seed=1)
+            self.assertIsInstance(mapped.masks(), numpy.memmap)
+            self.assertFalse(mapped.harmony().flags.writeable)
+            self.assertEqual(mapped.masks().tolist(), container.masks())
+            self.assertEqual(mapped.nearest(chord, 20),
+                             container.nearest(chord, 20))
+            mapped.remove(chord)
+            self.assertEqual(len(Container.load(path)), len(container))
+            del mapped
+
+            container.save(path, features=False)
+            self.assertEqual(Container.load(path).masks().tolist(),
+                             container.masks())
+            self.assertEqual(Container.load(path, mmap=False).masks(),
+                             container.masks())
+
+            Container().save(path)
+            self.assertEqual(len(Container.load(path)), 0)
+            with open(path, "wb") as f:
+                f.write(b"not a container file")
+            with self.assertRaises(ValueError):
+                Container.load(path)
+
+            for masks in [[1, 145], [145, 145], [548, 145], [145, 1 << 12]]:
+                with self.assertRaises(ValueError):
+                    save_columns(path, masks)
+                # 绕过 save_columns 写入的文件在读取时同样被拒绝
+                with open(path, "wb") as f:
+                    f.write(CONTAINER_HEADER.pack(
+                        CONTAINER_MAGIC, CONTAINER_VERSION, len(masks), 0))
+                    f.write(numpy.asarray(masks, dtype="<u2").tobytes())
+                for mmap in [True, False]:
+                    with self.assertRaises(ValueError):
+                        Container.load(path, mmap=mmap)
+
+    def test_incremental(self):
+        masks = [m for m in range(1 << 12) if m.bit_count() >= 2]
+        chord = Chord([0, 4, 7])
+        rng = numpy.random.default_rng(0)
+        for lazy in [False, True]:
+            container = Container(notes=range(12), lazy=lazy)
+            container.nearest(chord, 1)
+            container.query((4, 6))
+            with instrument.enabled():
+                for i, mask in enumerate(rng.choice(masks, 600).tolist()):
+                    other = Chord.from_mask(mask)
+                    if other in container:
+                        container.remove(other)
+                    else:
+                        container.add(other)
+                    if i % 100 == 0:
+                        expected = Container(chords=list(container))
+                        self.assertEqual(len(container), len(expected))
+                        self.assertEqual(container.nearest(other, 30),
+                                         expected.nearest(other, 30))
+                        self.assertEqual(container.query((3, 6), (10, 2)),
+                                         expected.query((3, 6), (10, 2)))
+                        self.assertEqual(
+                            container.infer_many([other] * 5, seed=1),
+                            expected.infer_many([other] * 5, seed=1),
+                        )
+            # 只有用于比较的新容器建立了 KD 树
+            self.assertEqual(
+                instrument.snapshot()["calls"]["KDTree.__init__"]["count"], 6)
+            instrument.reset()
+
     def test_infer(self):
         raise NotImplementedError
 
+    def test_lazy(self):
+        lazy = Container(notes=range(12), lazy=True)
+        eager = Container(notes=range(12))
+        self.assertEqual(len(lazy), len(eager))
+        self.assertEqual(lazy.chords(), eager.chords())
+        self.assertIn(Chord([0, 4, 7]), lazy)
+        self.assertEqual(lazy.nearest(Chord([0, 4, 7]), 20),
+                         eager.nearest(Chord([0, 4, 7]), 20))
+
+        lazy = Container(notes=[0, 3, 6, 9], lazy=True)
+        lazy.remove(Chord([0, 3, 6]))
+        self.assertNotIn(Chord([0, 3, 6]), lazy)
+        with self.assertRaises(KeyError):
+            lazy.remove(Chord([0, 3, 6]))
+        lazy.add(Chord([0, 4, 7]))
+        lazy.add_by_notes([0, 3, 6, 9, 10], 3)
+        self.assertIn(Chord([0, 3, 6]), lazy)
+        self.assertEqual(len(lazy), len(list(lazy)))
+
+        eager = Container(notes=[0, 3, 6, 9])
+        eager.add(Chord([0, 4, 7]))
+        eager.add_by_notes([0, 3, 6, 9, 10], 3)
+        self.assertEqual(lazy.chords(), eager.chords())
+        self.assertEqual(lazy.masks(), eager.masks())
+
+        lazy = Container(lazy=True)
+        lazy.add_by_notes([0, 2, 4, 5, 7, 9, 11], 3)
+        self.assertNotIn(Chord([0, 2]), lazy)
+        self.assertNotIn(Chord([0, 1, 2]), lazy)
+        self.assertEqual(len(lazy), 35)
+        with self.assertRaises(ValueError):
+            lazy.add_by_notes([0, 2, 4], 1)
+
+    def test_infer_many(self):
+        container = Container(notes=range(12), seed=0)
+        chords = [Chord.from_mask(m) for m in range(3, 1 << 12, 11)
+                  if m.bit_count() >= 2]
+        k = int(0.1 * len(container)) + 1
+        picks = numpy.random.default_rng(42).integers(0, k, len(chords))
+        self.assertEqual(
+            container.infer_many(chords, 0.1, seed=42, block_size=50),
+            [container.nearest(c, k)[p] for c, p in zip(chords, picks)],
+        )
+
+        self.assertEqual(
+            Container(notes=range(12), seed=1).infer_many(chords),
+            Container(notes=range(12), seed=1).infer_many(chords),
+        )
+        self.assertEqual(container.infer_many([]), [])
+
+
+class TestColumnarContainer(unittest.TestCase):
+
+    def test_init(self):
+        self.assertEqual(ColumnarContainer().chords(), set())
+        chords = {
+            Chord([0, 4, 7]),
+            Chord([2, 5, 8]),
+            Chord([1, 3, 5, 7]),
+        }
+        self.assertEqual(ColumnarContainer(chords=chords).chords(), chords)
+        self.assertEqual(ColumnarContainer(notes=[0, 3, 6, 9]).chords(),
+                         Container(notes=[0, 3, 6, 9]).chords())
+
+    def test_add_remove(self):
+        container = ColumnarContainer(notes=[0, 1, 2])
+        container.add(Chord([0, 4, 7]))
+        container.add(Chord([0, 4, 7]))
+        self.assertIn(Chord([0, 4, 7]), container.chords())
+        self.assertEqual(len(container), 5)
+
+        container.remove(Chord([0, 1, 2]))
+        self.assertNotIn(Chord([0, 1, 2]), container)
+        with self.assertRaises(KeyError):
+            container.remove(Chord([0, 1, 2]))
+
+        self.assertEqual(list(container.masks()),
+                         sorted(_.mask() for _ in container.chords()))
+        self.assertEqual(list(container.harmony()),
+                         [_.harmony() for _ in container])
+        with self.assertRaises(ValueError):
+            container.masks()[0] = 0
+
+    def test_query(self):
+        container = Container(notes=range(12))
+        ranges = [((4, 6), (0, 12)), ((0, 8), (5, 7)), ((4, 6), (11, 1)),
+                  ((3.3, 3.4), (10, 2)), ((6, 4), (0, 12))]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "chords.bin")
+            container.save(path)
+            mapped = Container.load(path)
+            self.assertIsInstance(mapped, ColumnarContainer)
+            self.assertIs(type(mapped.chords()), set)
+            self.assertEqual(mapped.chords(), container.chords())
+            for harmony, angle_5 in ranges:
+                self.assertEqual(mapped.query(harmony, angle_5, masks=True),
+                                 container.query(harmony, angle_5, masks=True))
+            self.assertEqual(mapped.query((4, 6)), container.query((4, 6)))
+            self.assertEqual(mapped.query(masks=True), container.masks())
+
+            mapped.remove(Chord([0, 4, 7]))
+            self.assertNotIn(Chord([0, 4, 7]), mapped.query((5, 6)))
+            mapped.add(Chord([0, 4, 7]))
+            self.assertIn(Chord([0, 4, 7]), mapped.query((5, 6)))
+            del mapped
+
+    def test_add_by_notes(self):
+        columnar = ColumnarContainer()
+        container = Container()
+        for num in [2, 3, 4]:
+            columnar.add_by_notes([0, 2, 4, 5, 7, 9, 11], num)
+            container.add_by_notes([0, 2, 4, 5, 7, 9, 11], num)
+        self.assertEqual(columnar.chords(), container.chords())
+
+    def test_infer(self):
+        columnar = ColumnarContainer(notes=range(12), seed=3)
+        container = Container(notes=range(12), seed=3)
+        chords = [Chord([0, 4, 7]), Chord([1, 2, 6, 9, 11]), Chord([3, 9])]
+        for chord in chords:
+            self.assertEqual(columnar.nearest(chord, 50),
+                             container.nearest(chord, 50))
+            self.assertEqual(columnar.infer(chord, 0, 0, 0.2),
+                             container.infer(chord, 0, 0, 0.2))
+        self.assertEqual(columnar.infer_many(chords * 10, 0.1),
+                         container.infer_many(chords * 10, 0.1))
+
+
+class TestProgressionGenerator(unittest.TestCase):
+
+    def test_candidates(self):
+        container = Container(notes=range(12))
+        generator = ProgressionGenerator(container, 0.05, block_size=500)
+        k = int(0.05 * len(container)) + 1
+        for chord in [Chord([0, 4, 7]), Chord([1, 2, 6, 9, 11])]:
+            self.assertEqual(generator.candidates(chord),
+                             container.nearest(chord, k))
+
+    def test_generate(self):
+        container = Container(notes=[0, 2, 4, 5, 7, 9, 11])
+        generator = ProgressionGenerator(container, 0.2, seed=0)
+        chord = Chord([0, 1])
+        progression = list(generator.generate(chord, 100))
+        self.assertEqual(len(progression), 100)
+        for next_chord in progression:
+            self.assertIn(next_chord, generator.candidates(chord))
+            chord = next_chord
+
+        masks = ProgressionGenerator(container, 0.2, seed=0) \
+            .generate_masks(Chord([0, 1]), 100)
+        self.assertEqual(list(masks), [_.mask() for _ in progression])
+
+
+class TestProgressionPlanner(unittest.TestCase):
+
+    targets = [(1.0, 0.5), (3.0, 1.0), (0.5, 0.0)]
+
+    def test_plan(self):
+        container = Container(notes=[0, 4, 7, 11])
+        planner = ProgressionPlanner(container, beam_width=None)
+        chord = Chord([0, 4, 7])
+        best = min(
+            itertools.product(container.chords(), repeat=len(self.targets)),
+            key=lambda x: planner.cost(chord, x, self.targets),
+        )
+        progression = planner.plan(chord, self.targets)
+        self.assertEqual(len(progression), len(self.targets))
+        self.assertAlmostEqual(planner.cost(chord, progression, self.targets),
+                               planner.cost(chord, best, self.targets))
+        self.assertEqual(planner.plan(chord, []), [])
+
+    def test_beam_width(self):
+        container = Container(notes=range(12))
+        chord = Chord([0, 4, 7])
+        costs = []
+        for beam_width in [1, 16, 128]:
+            planner = ProgressionPlanner(container, beam_width=beam_width)
+            progression = planner.plan(chord, self.targets * 3)
+            for next_chord in progression:
+                self.assertIn(next_chord, container)
+            costs.append(planner.cost(chord, progression, self.targets * 3))
+        self.assertLessEqual(costs[2], costs[1] + 1e-9)
+        self.assertLessEqual(costs[1], costs[0] + 1e-9)
+
+        with self.assertRaises(ValueError):
+            ProgressionPlanner(container, beam_width=0)
+
+
+class TestLegacyChord(unittest.TestCase):
+
+    def test_get_harmony(self):
+        for mask in range(1, 1 << 12):
+            notes = [colorChord.cNote(i + 1) for i in range(12)
+                     if mask >> i & 1]
+            chord = colorChord.Chord(notes)
+            expected = original_get_harmony(chord)
+            self.assertEqual(chord.get_harmony(), expected)
+            self.assertIs(type(chord.get_harmony()), type(expected))
+
+        rng = numpy.random.default_rng(0)
+        for _ in range(300):
+            notes = [colorChord.cNote(int(i) + 1)
+                     for i in rng.integers(0, 12, rng.integers(1, 8))]
+            chord = colorChord.Chord(notes)
+            self.assertEqual(chord.get_harmony(), original_get_harmony(chord))
+
+        chord = colorChord.Chord.init_by_note_name_str(["C", "E", "G"])
+        self.assertEqual(chord.get_harmony(), 10)
+        chord = colorChord.Chord.init_by_note_name_str(
+            ["C", "C#", "D", "D#", "E"])
+        self.assertEqual(chord.get_harmony(), 1.77777)
+        chord = colorChord.Chord.init_by_note_name_str(["C", "G", "G"])
+        self.assertEqual(chord.get_harmony(), original_get_harmony(chord))
+
+    def test_init_by_pitch_class_mask(self):
+        for mask in range(1, 1 << 12):
+            chord = colorChord.Chord.init_by_pitch_class_mask(mask)
+            self.assertEqual(chord.pitch_class_mask(), mask)
+        self.assertRaises(
+            ValueError, colorChord.Chord.init_by_pitch_class_mask, 0)
+        self.assertRaises(
+            ValueError, colorChord.Chord.init_by_pitch_class_mask, 1 << 12)
+        self.assertEqual(legacy_chord(0b10010001).pitch_class_mask(),
+                         0b10010001)
+
+    def test_get_pair_matrices(self):
+        chords = [legacy_chord(m) for m in range(1, 1 << 12, 37)]
+        for chord in chords:
+            chord.get_theta()
+        with tempfile.TemporaryDirectory() as directory:
+            color, tension, freshness = colorChord.get_pair_matrices(
+                chords, tile_size=16, directory=directory)
+            self.assertTrue(numpy.array_equal(
+                numpy.load(os.path.join(directory, "freshness.npy")),
+                freshness,
+            ))
+        Chord_ = colorChord.Chord
+        for i, chord1 in enumerate(chords):
+            for j, chord2 in enumerate(chords):
+                self.assertAlmostEqual(
+                    color[i, j], Chord_.get_color_change色彩变化(chord1, chord2),
+                    places=4)
+                self.assertAlmostEqual(
+                    tension[i, j],
+                    Chord_.get_tension_change紧张度变化(chord1, chord2),
+                    places=4)
+                self.assertAlmostEqual(
+                    freshness[i, j], Chord_.get_fressness新鲜度(chord1, chord2),
+                    places=4)
+
+
+class TestView(unittest.TestCase):
+
+    chords = Container(notes=[0, 2, 4, 5, 7, 9, 11]).chords()
+
+    def test_render(self):
+        from colorharmony import ChordRenderer
+        renderer = ChordRenderer()
+        png = renderer.render_bytes(self.chords, arrow=True)
+        self.assertTrue(png.startswith(b"\x89PNG"))
+        svg = renderer.render_bytes(list(self.chords)[:5], format="svg")
+        self.assertIn(b"<svg", svg)
+        self.assertNotIn("matplotlib.pyplot", sys.modules)
+
+    def test_render_many(self):
+        from colorharmony import render_many
+        chord_sets = [list(self.chords)[i:i+10] for i in range(0, 30, 10)]
+        with tempfile.TemporaryDirectory() as directory:
+            for processes in [None, 2]:
+                paths = render_many(chord_sets, directory,
+                                    processes=processes)
+                self.assertEqual(
+                    [os.path.basename(_) for _ in paths],
+                    ["000000.png", "000001.png", "000002.png"],
+                )
+                for path in paths:
+                    self.assertGreater(os.path.getsize(path), 0)
+
+            path = os.path.join(directory, "chords.svg")
+            show_chords(self.chords, img_path=path)
+            self.assertTrue(os.path.exists(path))
+
+
+class TestStream(unittest.TestCase):
+
+    lines = ["C E G", "", "A, C, E", "D F A C", "G B D F", "C E G"]
+
+    def test_parse_line(self):
+        chord = Chord([0, 4, 7])
+        self.assertEqual(stream.parse_line("C E G"), chord)
+        self.assertEqual(stream.parse_line("C,E, G"), chord)
+        self.assertEqual(stream.parse_line("C,E,G", "csv"), chord)
+        self.assertEqual(stream.parse_line('["C", "E", 7]', "jsonl"), chord)
+        self.assertEqual(
+            stream.parse_line('{"notes": ["C", "E", "G"]}', "jsonl"), chord)
+        self.assertIsNone(stream.parse_line("  \n"))
+        self.assertRaises(ValueError, stream.parse_line, "C X")
+        self.assertRaises(ValueError, stream.parse_line, "C C")
+        self.assertRaises(ValueError, stream.parse_line, "C E", "xml")
+        self.assertRaises(ValueError, stream.parse_line, '["C", "E"', "jsonl")
+        self.assertRaises(ValueError, stream.parse_line,
+                          '{"chord": ["C", "E", "G"]}', "jsonl")
+        self.assertRaises(ValueError, stream.parse_line, '"CEG"', "jsonl")
+        self.assertRaises(ValueError, stream.parse_line,
+                          '{"notes": "CEG"}', "jsonl")
+        self.assertRaises(ValueError, stream.parse_line, '145', "jsonl")
+
+    def test_analyze(self):
+        chords = list(stream.read_chords(self.lines))
+        rows = list(stream.analyze(chords))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]["notes"], "C E G")
+        self.assertIsNone(rows[0]["freshness"])
+        legacy = [legacy_chord(_.mask()) for _ in chords]
+        for chord in legacy:
+            chord.get_theta()
+        for row, chord, c1, c2 in zip(rows[1:], chords[1:], legacy, legacy[1:]):
+            self.assertEqual(row["mask"], chord.mask())
+            self.assertEqual(row["harmony"], chord.harmony())
+            self.assertEqual(row["angle_5"], chord.angle_5())
+            self.assertEqual(row["color"],
+                             colorChord.Chord.get_color_change色彩变化(c1, c2))
+            self.assertEqual(row["freshness"],
+                             colorChord.Chord.get_fressness新鲜度(c1, c2))
+
+        rows = list(stream.analyze(chords[1:], previous=chords[0]))
+        self.assertIsNotNone(rows[0]["freshness"])
+
+    def test_analyze_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "chords.txt")
+            with open(path, "w") as f:
+                f.write("\n".join(self.lines * 50) + "\n")
+            rows = list(stream.analyze_file(path))
+            self.assertEqual(len(rows), 250)
+            self.assertEqual(
+                list(stream.analyze_file(path, processes=2, chunk_size=64)),
+                rows,
+            )
+
+            output = os.path.join(directory, "result.jsonl")
+            stream.main([path, "-o", output])
+            with open(output) as f:
+                self.assertEqual([json.loads(_) for _ in f], rows)
+
+
+class TestServer(unittest.TestCase):
+
+    chords = [Chord.from_mask(m) for m in range(3, 1 << 12, 41)
+              if m.bit_count() >= 2]
+
+    def test_batching(self):
+        async def run():
+            server = InferenceServer(Container(notes=range(12), seed=1),
+                                     window=0.01)
+            results = await asyncio.gather(
+                *[server.infer(_) for _ in self.chords])
+            return server, results
+
+        server, results = asyncio.run(run())
+        expected = Container(notes=range(12), seed=1).infer_many(self.chords)
+        self.assertEqual(results, expected)
+        stats = server.stats()
+        self.assertEqual(stats["requests"], len(self.chords))
+        self.assertEqual(stats["batches"], 1)
+        self.assertIn("p99", stats["latency"])
+
+    def test_http(self):
+        container = Container(notes=[0, 2, 4, 5, 7, 9, 11])
+
+        async def run(path=None):
+            server = InferenceServer({"major": container}, window=0.005)
+            listener = await server.start(path=path)
+            port = None if path else listener.sockets[0].getsockname()[1]
+            clients = [InferenceClient(port=port, path=path)
+                       for _ in range(4)]
+            try:
+                results = await asyncio.gather(*[
+                    clients[i % 4].infer(chord, "major")
+                    for i, chord in enumerate(self.chords)
+                ])
+                errors = [
+                    await clients[0].request("POST", "/infer",
+                                             {"chord": "C E", "container": "x"}),
+                    await clients[0].request("POST", "/infer",
+                                             {"chord": "C X", "container": "major"}),
+                    await clients[0].request("GET", "/infer"),
+                ]
+                batch = await clients[0].request(
+                    "POST", "/infer", {"chords": ["C E G", [0, 1]],
+                                       "container": "major"})
+                stats = await clients[1].stats()
+            finally:
+                for client in clients:
+                    await client.close()
+                listener.close()
+                await listener.wait_closed()
+            return results, errors, batch, stats
+
+        results, errors, batch, stats = asyncio.run(run())
+        self.assertEqual(len(results), len(self.chords))
+        for chord in results:
+            self.assertIn(chord, container)
+        self.assertEqual([_[0] for _ in errors], [404, 400, 405])
+        self.assertEqual(batch[0], 200)
+        self.assertEqual(len(batch[1]["chords"]), 2)
+        self.assertEqual(stats["requests"], len(self.chords) + 2)
+        self.assertLess(stats["batches"], stats["requests"])
+
+        with tempfile.TemporaryDirectory() as directory:
+            results, *_ = asyncio.run(run(os.path.join(directory, "socket")))
+            self.assertEqual(len(results), len(self.chords))
+
+    def test_bad_requests(self):
+        async def send(port, data):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            try:
+                writer.write(data)
+                await writer.drain()
+                response = await reader.read()
+            finally:
+                writer.close()
+            head, _, body = response.partition(b"\r\n\r\n")
+            return int(head.split()[1]), json.loads(body)
+
+        def post(body):
+            return (f"POST /infer HTTP/1.1\r\nContent-Length: {len(body)}\r\n"
+                    f"Connection: close\r\n\r\n{body}").encode()
+
+        async def run(requests):
+            server = InferenceServer(Container(notes=range(5)))
+            listener = await server.start()
+            port = listener.sockets[0].getsockname()[1]
+            try:
+                return [await send(port, _) for _ in requests]
+            finally:
+                listener.close()
+                await listener.wait_closed()
+
+        responses = asyncio.run(run([
+            b"GARBAGE\r\n\r\n",
+            b"POST /infer HTTP/1.1\r\nno colon\r\n\r\n",
+            b"POST /infer HTTP/1.1\r\nContent-Length: -1\r\n\r\n",
+            post("{]x"),
+            post('{"chord": "C E", "temperature": Infinity}'),
+            post('{"chord": "C E", "temperature": NaN}'),
+            post('{"chord": "C E", "temperature": -0.5}'),
+            post('{"chord": "C E", "temperature": "hot"}'),
+            post('{"chord": "C E", "container": []}'),
+            post('{"chord": "C E", "container": {"a": 1}}'),
+        ]))
+        self.assertEqual([_[0] for _ in responses], [400] * 10)
+        for _, payload in responses:
+            self.assertIn("error", payload)
+        self.assertIn("temperature", responses[4][1]["error"])
+        self.assertIn("temperature", responses[6][1]["error"])
+        self.assertIn("container", responses[8][1]["error"])
+
+        responses = asyncio.run(run([
+            post('{"chord": "C E", "temperature": 1e308}'),
+            post('{"chord": "C E", "temperature": 0}'),
+        ]))
+        self.assertEqual([_[0] for _ in responses], [200] * 2)
+
+    def test_executor(self):
+        class SlowContainer:
+            def __len__(self):
+                return 0
+
+            def infer_many(self, chords, temperature=0.05):
+                time.sleep(0.2)
+                return list(chords)
+
+        async def run():
+            server = InferenceServer(SlowContainer(), window=0)
+            ticks = 0
+
+            async def tick():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+
+            ticker = asyncio.create_task(tick())
+            result = await server.infer(Chord([0, 4, 7]))
+            ticker.cancel()
+            return result, ticks
+
+        result, ticks = asyncio.run(run())
+        self.assertEqual(result, Chord([0, 4, 7]))
+        # infer_many 在线程池中执行时事件循环仍在运行
+        self.assertGreater(ticks, 5)
+
+
+class TestInstrument(unittest.TestCase):
+
+    def tearDown(self):
+        instrument.disable()
+        instrument.reset()
+
+    def test_enabled(self):
+        harmony = Chord.__dict__["harmony"]
+        new = Note.__dict__["__new__"]
+        container = Container(notes=range(5))
+        with instrument.enabled():
+            self.assertIsNot(Chord.__dict__["harmony"], harmony)
+            for _ in range(3):
+                container.infer(Chord([0, 4, 7]), None, None)
+            Note("C#")
+        self.assertIs(Chord.__dict__["harmony"], harmony)
+        self.assertIs(Note.__dict__["__new__"], new)
+        self.assertFalse(instrument.is_enabled())
+
+        snapshot = instrument.snapshot()
+        self.assertEqual(snapshot["calls"]["Container.infer"]["count"], 3)
+        self.assertEqual(snapshot["calls"]["Chord.__init__"]["count"], 3)
+        self.assertGreater(snapshot["calls"]["Container.infer"]["seconds"], 0)
+        self.assertEqual(snapshot["caches"]["Container.index"],
+                         {"hits": 2, "misses": 1, "hit_rate": 2 / 3})
+        self.assertEqual(json.loads(instrument.dump_json()), snapshot)
+
+        container.infer(Chord([0, 4, 7]), None, None)
+        self.assertEqual(instrument.snapshot(), snapshot)
+        instrument.reset()
+        self.assertEqual(instrument.snapshot(), {"calls": {}, "caches": {}})
+
+
+class TestImport(unittest.TestCase):
+
+    def test_lazy_import(self):
+        code = (
+            "import sys, time\n"
+            "start = time.perf_counter()\n"
+            "import colorharmony\n"
+            "print(time.perf_counter() - start)\n"
+            "print(' '.join(m for m in ['numpy', 'matplotlib']"
+            " if m in sys.modules))\n"
+        )
+        output = subprocess.run([sys.executable, "-c", code], check=True,
+                                capture_output=True, text=True,
+                                cwd=os.path.dirname(__file__)).stdout
+        seconds, heavy_modules = output.split("\n")[:2]
+        self.assertEqual(heavy_modules, "")
+        # 只是防止退化，实际上远小于这个值
+        self.assertLess(float(seconds), 2.0)
+
+    def test_lazy_attributes(self):
+        import colorharmony
+        from colorharmony import batch, view
+        self.assertIs(colorharmony.harmony_many, batch.harmony_many)
+        self.assertIs(colorharmony.show_chords, view.show_chords)
+        self.assertIn("ColumnarContainer", dir(colorharmony))
+        with self.assertRaises(AttributeError):
+            colorharmony.no_such_attribute
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_run(self):
+        import benchmark
+        report = benchmark.run(["harmony", "chord_hash"], repeat=1,
+                               min_time=0.01)
+        self.assertEqual(set(report["results"]), {"harmony", "chord_hash"})
+        for seconds in report["results"].values():
+            self.assertGreater(seconds, 0)
+
+    def test_compare(self):
+        import benchmark
+        baseline = {"results": {"a": 1.0, "b": 1.0, "c": 1.0}}
+        report = {"results": {"a": 1.1, "b": 1.3, "d": 9.0}}
+        self.assertEqual(benchmark.compare(report, baseline, 0.2),
+                         {"b": (1.3, 1.0)})
+
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file